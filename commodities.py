@@ -0,0 +1,225 @@
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from extract_metrics import gini
+from simulation import (
+    Supplier,
+    Buyer,
+    ScenarioConfig,
+    FairnessModule,
+    PolicyScoringModule,
+    MarketplaceModule,
+    EnvironmentalDataModule,
+    SPOILAGE_PER_100KM,
+    SPOILAGE_CAP,
+    WINTER_START_FRACTION,
+    weather_from_uniform,
+)
+
+
+# =========================
+#  COMMODITY DATA
+# =========================
+
+@dataclass
+class Crop:
+    name: str
+    spoilage_factor: float = 1.0  # multiplies the 5%/100km spoilage rate
+    weather_sensitivity: float = 1.0  # multiplies supplier weather susceptibility
+    winter_yield: float = 0.1  # yield factor for seasonal suppliers in winter
+
+
+def parse_crop(spec: str) -> Crop:
+    """Crop from "name[:spoilage_factor[:weather_sensitivity[:winter_yield]]]", e.g. "lettuce:2.0:1.2"."""
+    name, *values = spec.split(":")
+    if not name or len(values) > 3:
+        raise ValueError(f"Bad crop spec {spec!r}; expected name[:spoilage[:weather[:winter_yield]]]")
+    fields = ("spoilage_factor", "weather_sensitivity", "winter_yield")
+    return Crop(name, **{f: float(v) for f, v in zip(fields, values)})
+
+
+@dataclass
+class CommodityMarket:
+    """
+    Supplier x crop and buyer x crop arrays. A zero capacity means the supplier
+    does not grow that crop; a zero demand means the buyer does not buy it.
+    """
+    crops: List[Crop]
+    supplier_ids: List[str]
+    buyer_ids: List[str]
+    price: np.ndarray  # (S, C) unit price
+    water: np.ndarray  # (S, C) liters per unit
+    energy: np.ndarray  # (S, C) kWh per unit
+    cap_nominal: np.ndarray  # (S, C)
+    demand: np.ndarray  # (B, C)
+    distances: np.ndarray  # (S, B) km
+    reputation: np.ndarray  # (S,)
+    weather_susceptibility: np.ndarray  # (S,)
+    is_seasonal: np.ndarray  # (S,) bool
+
+    # Per-run state
+    Q: np.ndarray = field(default=None)
+    rot_wait: np.ndarray = field(default=None)
+    F_unified: np.ndarray = field(default=None)
+    waste: np.ndarray = field(default=None)
+
+    def __post_init__(self):
+        self.reset_state()
+
+    @property
+    def shape(self):
+        return self.cap_nominal.shape
+
+    def reset_state(self):
+        S, C = self.shape
+        self.Q = np.zeros((S, C))
+        self.rot_wait = np.zeros((S, C), dtype=np.int64)
+        self.F_unified = np.ones((S, C))
+        self.waste = np.zeros((S, C))
+
+    @classmethod
+    def from_agents(cls, suppliers: List[Supplier], buyers: List[Buyer],
+                    crops: Optional[List[Crop]] = None) -> "CommodityMarket":
+        """Single-commodity market equivalent to the agent-based setup."""
+        crops = crops or [Crop("default")]
+        C = len(crops)
+        col = lambda vals: np.repeat(np.array(vals, dtype=float)[:, None], C, axis=1)
+        return cls(
+            crops=crops,
+            supplier_ids=[s.id for s in suppliers],
+            buyer_ids=[b.id for b in buyers],
+            price=col([s.c for s in suppliers]),
+            water=col([s.water_footprint for s in suppliers]),
+            energy=col([s.energy_footprint for s in suppliers]),
+            cap_nominal=col([s.cap_nominal for s in suppliers]),
+            demand=col([b.demand_nominal for b in buyers]),
+            distances=np.array([[s.distances.get(b.id, 0.0) for b in buyers] for s in suppliers], dtype=float),
+            reputation=np.array([s.reputation for s in suppliers], dtype=float),
+            weather_susceptibility=np.array([s.weather_susceptibility for s in suppliers], dtype=float),
+            is_seasonal=np.array([s.is_seasonal for s in suppliers], dtype=bool),
+        )
+
+
+# =========================
+#  SIMULATION
+# =========================
+
+class CommoditySimulation:
+    """
+    Round loop over a CommodityMarket. Each buyer clears all crops at once via
+    the matrix methods on PolicyScoringModule / MarketplaceModule /
+    FairnessModule, so adding crops widens the arrays instead of adding
+    Python iterations.
+    """
+
+    def __init__(self, market: CommodityMarket, scenario: ScenarioConfig,
+                 weather: Optional[List[float]] = None, fairness: Optional[FairnessModule] = None):
+        self.market = market
+        self.scenario = scenario
+        self.weather = weather
+        self.fairness = fairness or FairnessModule(delta=scenario.delta, eps=1e-9, disp_cap=5.0)
+        self.policy = PolicyScoringModule(scenario)
+        self.marketplace = MarketplaceModule(EnvironmentalDataModule(0.0, {}, 0.0), self.fairness, self.policy)
+
+        T, C = scenario.T, len(market.crops)
+        self.allocated_per_t = np.zeros((T, C))
+        self.cost_total_per_t = np.zeros(T)
+
+    def _capacity(self, t: int, severity: float) -> np.ndarray:
+        m = self.market
+        sens = np.array([c.weather_sensitivity for c in m.crops])
+        yield_factor = 1.0 - m.weather_susceptibility[:, None] * severity * sens[None, :]
+        if t >= int(self.scenario.T * WINTER_START_FRACTION):
+            winter = np.array([c.winter_yield for c in m.crops])
+            yield_factor = np.where(m.is_seasonal[:, None], yield_factor * winter[None, :], yield_factor)
+        return m.cap_nominal * np.maximum(0.0, yield_factor)
+
+    def run(self) -> "CommoditySimulation":
+        m = self.market
+        T = self.scenario.T
+        spoil = np.array([c.spoilage_factor for c in m.crops])
+        base_rate = m.distances / 100.0 * SPOILAGE_PER_100KM  # (S, B), before the crop factor
+        sequential = self.scenario.allocation_mode == "sequential"
+        smoothing = self.scenario.reputation_smoothing
+
+        for t in range(1, T + 1):
+            roll = self.weather[t - 1] if self.weather is not None else random.random()
+            cap = self._capacity(t, weather_from_uniform(roll))
+
+            allocated = np.zeros_like(cap)
+            round_waste = np.zeros_like(cap)
+            for b in range(len(m.buyer_ids)):
+                eligible = cap > 0
+                scores = self.policy.compute_score_matrix(m.price, m.water, m.energy, m.reputation,
+                                                          m.F_unified, eligible)
+                cap_eligible = np.where(eligible, cap, 0.0)
+                if sequential:
+                    q = self.marketplace.allocate_sequential_matrix(scores, cap_eligible, m.demand[b])
+                else:
+                    q = self.marketplace.allocate_proportional_matrix(scores, cap_eligible, m.demand[b])
+                cap = cap - q
+                allocated += q
+
+                rate = np.minimum(base_rate[:, b][:, None] * spoil[None, :], SPOILAGE_CAP)
+                round_waste += q * rate
+
+            m.waste += round_waste
+            if smoothing > 0:
+                # Same EWMA as simulation.DeliveryModule, on quantities summed over crops
+                q_s = allocated.sum(axis=1)
+                delivered = q_s > 0
+                quality = 1.0 - round_waste.sum(axis=1)[delivered] / q_s[delivered]
+                m.reputation[delivered] += smoothing * (quality - m.reputation[delivered])
+
+            if self.scenario.use_fairness:
+                m.F_unified = self.fairness.update_fairness_arrays(m.Q, m.rot_wait, m.cap_nominal, allocated)
+            else:
+                m.Q += allocated
+
+            self.allocated_per_t[t - 1] = allocated.sum(axis=0)
+            self.cost_total_per_t[t - 1] = float(np.sum(allocated * m.price))
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        """extract_metrics-style summary (supplier shares summed over crops) plus a per-crop breakdown."""
+        m = self.market
+        Q_s = m.Q.sum(axis=1)
+        total = float(Q_s.sum())
+        shares = (Q_s / total).tolist() if total > 0 else [0.0] * len(Q_s)
+        per_crop = {}
+        for j, crop in enumerate(m.crops):
+            col = m.Q[:, j]
+            tot = float(col.sum())
+            per_crop[crop.name] = {
+                "total_allocated": tot,
+                "share_gini": gini((col / tot).tolist()) if tot > 0 else 0.0,
+                "total_waste": float(m.waste[:, j].sum()),
+                "cost_total": float(np.sum(col * m.price[:, j])),
+            }
+        # Indoor/Outdoor shares by supplier id, as in extract_metrics
+        groups = {"Indoor": 0.0, "Outdoor": 0.0}
+        for sid, q in zip(m.supplier_ids, Q_s.tolist()):
+            for g in groups:
+                if g in sid:
+                    groups[g] += q
+                    break
+        if total > 0:
+            groups = {g: v / total for g, v in groups.items()}
+        return {
+            "summary": {
+                "total_allocated": total,
+                "share_gini": gini(shares),
+                "share_max": max(shares) if shares else 0.0,
+                "total_water": float(np.sum(m.Q * m.water)),
+                "total_energy": float(np.sum(m.Q * m.energy)),
+                "total_waste": float(m.waste.sum()),
+                "cost_mean": float(self.cost_total_per_t.mean()) if len(self.cost_total_per_t) else 0.0,
+                "participation_rate": sum(1 for s in shares if s > 1e-9) / len(shares) if shares else 0.0,
+            },
+            "groups": groups,
+            "crops": per_crop,
+            "timeseries": {"supply": self.allocated_per_t.sum(axis=1).tolist()},
+        }
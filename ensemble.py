@@ -0,0 +1,213 @@
+import argparse
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist, mean, stdev
+from typing import Dict, Any, List, Optional
+
+from run_experiments import run_one
+from results_store import ResultsStore
+from scenarios import SCENARIOS
+from workqueue import WorkQueue, make_task
+import telemetry
+
+
+# Fewer seeds than this make the CI itself too unreliable to stop on
+MIN_REPLICAS = 4
+
+# Below this df, t_quantile inverts the exact CDF; above, Cornish-Fisher is within 1e-4
+_EXACT_DF = 30
+
+
+def _t_cdf(t: float, df: int) -> float:
+    """Student-t CDF for integer df (Abramowitz & Stegun 26.7.3-4)."""
+    theta = math.atan(abs(t) / math.sqrt(df))
+    s, c2 = math.sin(theta), math.cos(theta) ** 2
+    if df % 2:
+        term, series = math.cos(theta), 0.0
+        for k in range(1, (df - 1) // 2 + 1):
+            series += term
+            term *= c2 * (2 * k) / (2 * k + 1)
+        a = 2.0 / math.pi * (theta + s * series) if df > 1 else 2.0 * theta / math.pi
+    else:
+        term, series = 1.0, 0.0
+        for k in range(1, df // 2 + 1):
+            series += term
+            term *= c2 * (2 * k - 1) / (2 * k)
+        a = s * series
+    return 0.5 + math.copysign(a / 2.0, t)
+
+
+def t_quantile(p: float, df: int) -> float:
+    """Student-t quantile: exact for small integer df, Cornish-Fisher expansion above."""
+    if df < _EXACT_DF and df == int(df):
+        if p == 0.5:
+            return 0.0
+        if p < 0.5:
+            return -t_quantile(1.0 - p, df)
+        lo, hi = 0.0, 1.0
+        while _t_cdf(hi, int(df)) < p:
+            hi *= 2.0
+        for _ in range(100):
+            mid = 0.5 * (lo + hi)
+            if _t_cdf(mid, int(df)) < p:
+                lo = mid
+            else:
+                hi = mid
+        return 0.5 * (lo + hi)
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4.0
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96.0
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384.0
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3
+
+
+def ci_half_width(values: List[float], confidence: float = 0.95) -> float:
+    n = len(values)
+    if n < 2:
+        return math.inf
+    return t_quantile(0.5 + confidence / 2.0, n - 1) * stdev(values) / math.sqrt(n)
+
+
+def _run_task(task):
+    key, seed = task
+    return key, seed, run_one(key, seed=seed)
+
+
+def run_ensemble(
+        scenario_keys: List[str],
+        targets: Dict[str, float],
+        confidence: float = 0.95,
+        batch_size: int = 8,
+        min_seeds: int = 8,
+        max_seeds: int = 256,
+        seed_start: int = 0,
+        workers: int = 1,
+        store_path: Optional[str] = None,
+        queue_dir: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Sequential stopping: keep dispatching seeds in batches until, for every
+    scenario, the confidence interval width (2 x half-width) of each summary
+    metric in `targets` is at most its target, or `max_seeds` is reached.
+    With `queue_dir`, batches go to a workqueue.py queue instead of a local
+    process pool, so workers on other hosts can take part.
+    """
+    if min_seeds < MIN_REPLICAS:
+        raise ValueError(f"min_seeds must be at least {MIN_REPLICAS}, got {min_seeds}")
+    values = {key: {m: [] for m in targets} for key in scenario_keys}
+    seeds_used = {key: [] for key in scenario_keys}
+    active = list(scenario_keys)
+    next_seed = {key: seed_start for key in scenario_keys}
+    records = []
+
+    tel = telemetry.current()
+    queue = WorkQueue(queue_dir) if queue_dir else None
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and queue is None else None
+    try:
+        while active:
+            tasks = []
+            for key in active:
+                n = len(seeds_used[key])
+                # First batch goes straight to min_seeds
+                size = max(batch_size, min_seeds - n)
+                size = min(size, max_seeds - n)
+                tasks += [(key, next_seed[key] + i) for i in range(size)]
+                next_seed[key] += size
+            if tel is not None:
+                tel.plan(len(tasks))  # grows batch by batch; the ETA covers dispatched work
+
+            if queue is not None:
+                metrics = queue.map([make_task(SCENARIOS[key], key, seed, "ensemble") for key, seed in tasks])
+                done = [(key, seed, m) for (key, seed), m in zip(tasks, metrics)]
+            elif pool is not None:
+                done = pool.map(_run_task, tasks)
+            else:
+                done = map(_run_task, tasks)
+            for key, seed, metrics in done:
+                seeds_used[key].append(seed)
+                for m in targets:
+                    values[key][m].append(metrics["summary"][m])
+                records.append((SCENARIOS[key], seed, metrics))
+                if tel is not None:
+                    tel.run_done(metrics)
+
+            still_active = []
+            for key in active:
+                n = len(seeds_used[key])
+                converged = n >= min_seeds and all(
+                    2.0 * ci_half_width(values[key][m], confidence) <= w for m, w in targets.items()
+                )
+                if not converged and n < max_seeds:
+                    still_active.append(key)
+            active = still_active
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if store_path:
+        with ResultsStore(store_path) as store:
+            store.insert_runs(records, experiment="ensemble")
+
+    report = {}
+    for key in scenario_keys:
+        per_metric = {}
+        for m, target in targets.items():
+            vals = values[key][m]
+            hw = ci_half_width(vals, confidence)
+            per_metric[m] = {
+                "mean": mean(vals),
+                "std": stdev(vals) if len(vals) > 1 else 0.0,
+                "ci_width": 2.0 * hw,
+                "target_width": target,
+                "met": 2.0 * hw <= target,
+            }
+        report[key] = {
+            "seeds_used": len(seeds_used[key]),
+            "seeds": seeds_used[key],
+            "confidence": confidence,
+            "converged": all(v["met"] for v in per_metric.values()),
+            "metrics": per_metric,
+        }
+    return report
+
+
+def _parse_targets(items: List[str]) -> Dict[str, float]:
+    targets = {}
+    for item in items:
+        metric, _, width = item.partition("=")
+        targets[metric] = float(width)
+    return targets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run seeds until the CI on chosen metrics is narrow enough")
+    parser.add_argument("--scenarios", nargs="+", default=["S1", "S2", "S3"])
+    parser.add_argument("--target", nargs="+", default=["share_gini=0.01", "cost_mean=1.0"],
+                        metavar="METRIC=WIDTH", help="Target full CI width per summary metric")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--min-seeds", type=int, default=8)
+    parser.add_argument("--max-seeds", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--store", metavar="DB", default=None)
+    parser.add_argument("--queue", metavar="DIR", default=None,
+                        help="Dispatch batches through a workqueue.py directory (start workers separately)")
+    parser.add_argument("--out", default="ensemble.json")
+    telemetry.add_telemetry_argument(parser)
+    args = parser.parse_args()
+    telemetry.configure(args.telemetry)
+
+    report = run_ensemble(
+        args.scenarios, _parse_targets(args.target), confidence=args.confidence,
+        batch_size=args.batch_size, min_seeds=args.min_seeds, max_seeds=args.max_seeds,
+        workers=args.workers, store_path=args.store, queue_dir=args.queue,
+    )
+    for key, rep in report.items():
+        status = "converged" if rep["converged"] else "budget hit"
+        print(f"{key}: {rep['seeds_used']} seeds ({status})")
+        for m, v in rep["metrics"].items():
+            print(f"  {m:<14} mean={v['mean']:.4f}  CI width={v['ci_width']:.4f} (target {v['target_width']})")
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {args.out}")
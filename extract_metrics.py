@@ -1,7 +1,35 @@
 from __future__ import annotations
 from typing import Dict, Any, List
 from collections import defaultdict
-from simulation import Supplier, ScenarioConfig, Logger
+from simulation import Supplier, ScenarioConfig, Logger, EventBus
+
+
+class RunAccumulator:
+    """
+    Lightweight EventBus sink for headless runs. Keeps only what extract_metrics
+    needs (per-supplier totals, per-round supply and cost) instead of the
+    Logger's per-round allocation copies and fairness snapshots.
+    Pass track_cost=False to skip the cost computation entirely.
+    """
+
+    def __init__(self, track_cost: bool = True):
+        self.track_cost = track_cost
+        self.Q_by_id: Dict[str, float] = defaultdict(float)
+        self.allocated_total_per_t: List[float] = []
+        self.cost_total_per_t: List[float] = []
+
+    def attach(self, events: EventBus) -> None:
+        events.subscribe("allocation", self._on_allocation)
+        if self.track_cost:
+            events.subscribe("cost", self._on_cost)
+
+    def _on_allocation(self, t, allocations):
+        for (sid, _bid), q in allocations.items():
+            self.Q_by_id[sid] += float(q)
+        self.allocated_total_per_t.append(sum(float(q) for q in allocations.values()))
+
+    def _on_cost(self, t, cost):
+        self.cost_total_per_t.append(float(cost))
 
 
 def gini(values: List[float]) -> float:
@@ -27,11 +55,14 @@ def extract_metrics(
         logger: Logger,
         seed: int,
 ) -> Dict[str, Any]:
-    # 1. Aggregate Allocations from Log
-    Q_by_id = defaultdict(float)
-    for alloc_t in logger.allocations_per_t:
-        for (sid, _bid), q in alloc_t.items():
-            Q_by_id[sid] += float(q)
+    # 1. Aggregate Allocations from Log (RunAccumulator keeps them pre-aggregated)
+    if isinstance(logger, RunAccumulator):
+        Q_by_id = logger.Q_by_id
+    else:
+        Q_by_id = defaultdict(float)
+        for alloc_t in logger.allocations_per_t:
+            for (sid, _bid), q in alloc_t.items():
+                Q_by_id[sid] += float(q)
 
     total_alloc = sum(Q_by_id.values())
 
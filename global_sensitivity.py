@@ -0,0 +1,276 @@
+import argparse
+import dataclasses
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from run_experiments import run_scenario
+from results_store import ResultsStore
+from scenarios import SCENARIOS
+from simulation import ScenarioConfig, weather_draws
+import telemetry
+
+# Optional: scipy's scrambled Sobol sequence gives better coverage than plain uniforms
+try:
+    from scipy.stats import qmc
+except ImportError:  # pragma: no cover
+    qmc = None
+
+
+# Default factors: ScenarioConfig field -> (low, high)
+DEFAULT_BOUNDS: Dict[str, Tuple[float, float]] = {
+    "alpha": (0.0, 1.0),
+    "beta": (0.0, 1.0),
+    "gamma": (0.0, 1.0),
+    "delta": (0.0, 1.0),
+    "scarcity_cost_water": (0.0, 0.1),
+    "scarcity_cost_energy": (0.0, 0.2),
+}
+
+SUMMARY_METRICS = [
+    "total_allocated", "share_gini", "share_max", "total_water",
+    "total_energy", "total_waste", "cost_mean", "participation_rate",
+]
+
+
+# =========================
+#  SAMPLING
+# =========================
+
+def _unit_samples(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    if qmc is not None:
+        return qmc.Sobol(d, scramble=True, seed=rng).random(n)
+    return rng.random((n, d))
+
+
+def saltelli_sample(n: int, bounds: Dict[str, Tuple[float, float]], seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Saltelli design: base matrices A and B (n x d) and, for each factor i, AB_i
+    (A with column i taken from B). n * (d + 2) evaluations in total.
+    Returns unit-cube matrices; scale them with `scale`.
+    """
+    d = len(bounds)
+    rng = np.random.default_rng(seed)
+    AB = _unit_samples(n, 2 * d, rng)
+    A, B = AB[:, :d], AB[:, d:]
+    ABi = np.repeat(A[None, :, :], d, axis=0)
+    for i in range(d):
+        ABi[i, :, i] = B[:, i]
+    return {"A": A, "B": B, "AB": ABi}
+
+
+def morris_sample(r: int, bounds: Dict[str, Tuple[float, float]], levels: int = 4, seed: int = 0) -> np.ndarray:
+    """
+    r one-at-a-time trajectories of d + 1 points on a `levels` grid (Morris 1991).
+    Shape (r, d + 1, d) in the unit cube.
+    """
+    d = len(bounds)
+    rng = np.random.default_rng(seed)
+    step = levels / (2.0 * (levels - 1))
+    grid = np.arange(levels // 2) / (levels - 1)  # base values that leave room for +step
+    traj = np.empty((r, d + 1, d))
+    for k in range(r):
+        x = rng.choice(grid, size=d)
+        traj[k, 0] = x
+        for j, i in enumerate(rng.permutation(d), start=1):
+            x = x.copy()
+            x[i] += step
+            traj[k, j] = x
+    return traj
+
+
+def scale(unit: np.ndarray, bounds: Dict[str, Tuple[float, float]]) -> np.ndarray:
+    lo = np.array([b[0] for b in bounds.values()])
+    hi = np.array([b[1] for b in bounds.values()])
+    return lo + unit * (hi - lo)
+
+
+# =========================
+#  EVALUATION
+# =========================
+
+def _eval_batch(task) -> np.ndarray:
+    base, names, rows, seed, weather, store_path = task
+    out = np.empty((len(rows), len(SUMMARY_METRICS)))
+    records = []
+    for k, row in enumerate(rows):
+        cfg = dataclasses.replace(base, name=f"{base.name}_GSA", **dict(zip(names, map(float, row))))
+        metrics = run_scenario(cfg, "GSA", seed=seed, weather=weather, headless=True)
+        out[k] = [metrics["summary"][m] for m in SUMMARY_METRICS]
+        if store_path:
+            records.append((cfg, seed, metrics))
+    if records:
+        # WAL mode lets every worker bulk insert its own batch
+        with ResultsStore(store_path) as store:
+            store.insert_runs(records, experiment="gsa")
+    return out
+
+
+def evaluate(X: np.ndarray, names: List[str], base: ScenarioConfig, seed: int = 42,
+             workers: Optional[int] = None, batch_size: int = 64,
+             store_path: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Run one headless simulation per row of X (factor values in `names` order).
+    Rows are shipped to worker processes in batches; all runs share the same
+    weather draws (common random numbers) so differences come from the factors.
+
+    Runs use the agent loop (run_scenario, headless) rather than the matrix
+    engine in commodities.py: for this single-crop population both give the
+    same metrics, and the array overhead makes CommoditySimulation 2-3x slower
+    per run (about 6.5 ms against 2-3 ms for S1/S3). It only pays off once
+    many crops are cleared together.
+    """
+    flat = X.reshape(-1, X.shape[-1])
+    weather = weather_draws(base.T, seed)
+    tasks = [(base, names, flat[i:i + batch_size], seed, weather, store_path)
+             for i in range(0, len(flat), batch_size)]
+
+    tel = telemetry.current()
+    if tel is not None:
+        tel.plan(len(flat))
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(tasks) > 1 else None
+    try:
+        parts = []
+        for part in (pool.map(_eval_batch, tasks) if pool is not None else map(_eval_batch, tasks)):
+            parts.append(part)
+            if tel is not None:
+                tel.run_done(n=len(part))
+        Y = np.concatenate(parts)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    shape = X.shape[:-1]
+    return {m: Y[:, j].reshape(shape) for j, m in enumerate(SUMMARY_METRICS)}
+
+
+# =========================
+#  INDICES
+# =========================
+
+def _sobol_indices(fA, fB, fAB):
+    # Centre outputs first: the estimators are unbiased either way but much
+    # noisier when the mean is large relative to the spread (e.g. cost_mean)
+    centre = np.mean(np.concatenate([fA, fB]))
+    fA, fB, fAB = fA - centre, fB - centre, fAB - centre
+    var = np.var(np.concatenate([fA, fB]), ddof=1)
+    if var <= 0:
+        zeros = np.zeros(fAB.shape[0])
+        return zeros, zeros
+    # Saltelli (2010) first order, Jansen (1999) total effect
+    S1 = np.mean(fB[None, :] * (fAB - fA[None, :]), axis=1) / var
+    ST = 0.5 * np.mean((fA[None, :] - fAB) ** 2, axis=1) / var
+    return S1, ST
+
+
+def sobol_indices(fA: np.ndarray, fB: np.ndarray, fAB: np.ndarray, names: List[str],
+                  n_boot: int = 500, confidence: float = 0.95, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    S1, ST = _sobol_indices(fA, fB, fAB)
+    rng = np.random.default_rng(seed)
+    n = len(fA)
+    boot1 = np.empty((n_boot, len(names)))
+    bootT = np.empty((n_boot, len(names)))
+    for k in range(n_boot):
+        idx = rng.integers(0, n, n)
+        boot1[k], bootT[k] = _sobol_indices(fA[idx], fB[idx], fAB[:, idx])
+    q = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    ci1 = np.percentile(boot1, q, axis=0)
+    ciT = np.percentile(bootT, q, axis=0)
+    return {
+        name: {
+            "S1": float(S1[i]), "S1_ci": [float(ci1[0, i]), float(ci1[1, i])],
+            "ST": float(ST[i]), "ST_ci": [float(ciT[0, i]), float(ciT[1, i])],
+        }
+        for i, name in enumerate(names)
+    }
+
+
+def morris_indices(traj: np.ndarray, f: np.ndarray, names: List[str]) -> Dict[str, Dict[str, float]]:
+    """mu* (mean |elementary effect|) and sigma per factor, in unit-cube steps."""
+    r, _, d = traj.shape
+    effects = np.empty((r, d))
+    for k in range(r):
+        dx = np.diff(traj[k], axis=0)
+        moved = np.argmax(np.abs(dx), axis=1)
+        effects[k, moved] = np.diff(f[k]) / dx[np.arange(d), moved]
+    return {
+        name: {
+            "mu": float(effects[:, i].mean()),
+            "mu_star": float(np.abs(effects[:, i]).mean()),
+            "sigma": float(effects[:, i].std(ddof=1)) if r > 1 else 0.0,
+        }
+        for i, name in enumerate(names)
+    }
+
+
+def run_sobol(n: int = 256, bounds: Dict[str, Tuple[float, float]] = DEFAULT_BOUNDS, base_key: str = "S3",
+              seed: int = 42, workers: Optional[int] = None, n_boot: int = 500,
+              store_path: Optional[str] = None) -> Dict[str, Any]:
+    names = list(bounds)
+    design = saltelli_sample(n, bounds, seed=seed)
+    base = SCENARIOS[base_key]
+    X = np.concatenate([design["A"][None], design["B"][None], design["AB"]])  # (d + 2, n, d)
+    Y = evaluate(scale(X, bounds), names, base, seed=seed, workers=workers, store_path=store_path)
+    return {
+        "method": "sobol",
+        "base": base_key,
+        "n": n,
+        "runs": int(np.prod(X.shape[:-1])),
+        "bounds": bounds,
+        "indices": {m: sobol_indices(y[0], y[1], y[2:], names, n_boot=n_boot, seed=seed) for m, y in Y.items()},
+    }
+
+
+def run_morris(r: int = 32, bounds: Dict[str, Tuple[float, float]] = DEFAULT_BOUNDS, base_key: str = "S3",
+               levels: int = 4, seed: int = 42, workers: Optional[int] = None,
+               store_path: Optional[str] = None) -> Dict[str, Any]:
+    names = list(bounds)
+    traj = morris_sample(r, bounds, levels=levels, seed=seed)
+    Y = evaluate(scale(traj, bounds), names, SCENARIOS[base_key], seed=seed, workers=workers, store_path=store_path)
+    return {
+        "method": "morris",
+        "base": base_key,
+        "r": r,
+        "runs": int(np.prod(traj.shape[:-1])),
+        "bounds": bounds,
+        "indices": {m: morris_indices(traj, y, names) for m, y in Y.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Global sensitivity analysis over ScenarioConfig fields")
+    parser.add_argument("method", choices=["sobol", "morris"])
+    parser.add_argument("-n", type=int, default=256, help="Sobol base samples, or Morris trajectories")
+    parser.add_argument("--base", default="S3", choices=sorted(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bootstrap", type=int, default=500)
+    parser.add_argument("--store", metavar="DB", default=None, help="Also insert every run into a ResultsStore")
+    parser.add_argument("--out", default=None)
+    telemetry.add_telemetry_argument(parser)
+    args = parser.parse_args()
+    telemetry.configure(args.telemetry)
+
+    if args.method == "sobol":
+        report = run_sobol(args.n, base_key=args.base, seed=args.seed, workers=args.workers,
+                           n_boot=args.bootstrap, store_path=args.store)
+    else:
+        report = run_morris(args.n, base_key=args.base, seed=args.seed, workers=args.workers,
+                            store_path=args.store)
+
+    print(f"{report['method']}: {report['runs']} runs")
+    for metric in ("share_gini", "cost_mean", "total_waste"):
+        print(f"  {metric}")
+        for name, idx in report["indices"][metric].items():
+            if args.method == "sobol":
+                print(f"    {name:<22} S1={idx['S1']:+.3f}  ST={idx['ST']:.3f}")
+            else:
+                print(f"    {name:<22} mu*={idx['mu_star']:.4f}  sigma={idx['sigma']:.4f}")
+    out = args.out or f"gsa_{args.method}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {out}")
@@ -1,3 +1,4 @@
+import argparse
 import json
 import random
 
@@ -13,9 +14,10 @@ from simulation import (
 )
 from scenarios import SCENARIOS
 from extract_metrics import extract_metrics
+from profiling import add_profile_arguments, profiler_from_args, write_profile
 
 
-def run_single(scenario_key: str = "S1", seed: int = 42):
+def run_single(scenario_key: str = "S1", seed: int = 42, profiler=None):
     scenario = SCENARIOS[scenario_key]
     random.seed(seed)
 
@@ -44,6 +46,7 @@ def run_single(scenario_key: str = "S1", seed: int = 42):
         marketplace=marketplace,
         logger=logger,
         scenario=scenario,
+        profiler=profiler,
     )
     sim.run()
 
@@ -65,6 +68,12 @@ def run_single(scenario_key: str = "S1", seed: int = 42):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run S1-S3 once as a sanity check")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = profiler_from_args(args)
+
     # Test all 3 scenarios to verify the logic
     for s in ["S1", "S2", "S3"]:
-        run_single(s, seed=42)
\ No newline at end of file
+        run_single(s, seed=42, profiler=profiler)
+    write_profile(profiler, args.profile)
\ No newline at end of file
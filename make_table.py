@@ -1,8 +1,11 @@
 import json
+import sys
 
 
 import json
 
+from results_store import load_results
+
 
 def build_table(results):
     keys = ["S1", "S2", "S3"]
@@ -60,8 +63,7 @@ def build_tablei(results):
 
 
 if __name__ == "__main__":
-    with open("results.json", "r") as f:
-        results = json.load(f)
+    results = load_results(sys.argv[1] if len(sys.argv) > 1 else "results.json")
 
     tex = build_table(results)
     texi = build_tablei(results)
@@ -101,8 +103,7 @@ def build_table(results):
 
 
 if __name__ == "__main__":
-    with open("results.json", "r") as f:
-        results = json.load(f)
+    results = load_results(sys.argv[1] if len(sys.argv) > 1 else "results.json")
 
     tex = build_table(results)
     with open("table_results.tex", "w") as f:
@@ -1,19 +1,86 @@
+import argparse
+import hashlib
+import inspect
 import json
 import os
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import results_store
+
+FIG_DIR = "figures"
+HASH_FILE = os.path.join(FIG_DIR, ".figure_hashes.json")
 
 
 def load_results(path="results.json"):
-    with open(path, "r") as f: return json.load(f)
+    # Accepts results.json or a ResultsStore database (results.db)
+    return results_store.load_results(path)
+
+
+def _pyplot():
+    # matplotlib is only imported when a figure is actually rendered
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def save_fig(fig, name):
-    os.makedirs("figures", exist_ok=True)
-    fig.savefig(f"figures/{name}.png", bbox_inches="tight", dpi=300)
+    plt = _pyplot()
+    os.makedirs(FIG_DIR, exist_ok=True)
+    fig.savefig(f"{FIG_DIR}/{name}.png", bbox_inches="tight", dpi=300)
     plt.close(fig)
 
 
+# =========================
+#  FIGURE REGISTRY
+# =========================
+
+# name -> (render function, input selector)
+FIGURES: Dict[str, Any] = {}
+
+SCENARIO_KEYS = ["S1", "S2", "S3"]
+
+
+def figure(name, select):
+    """
+    Register a figure renderer. `select(results)` returns the slice of the results
+    the figure reads; it is hashed to decide whether the figure is stale and is
+    the only data shipped to the worker process.
+    """
+    def register(fn):
+        FIGURES[name] = (fn, select)
+        return fn
+    return register
+
+
+def _pick(*path, keys=SCENARIO_KEYS):
+    # Selector keeping results[k][path...] for each scenario key, in the original layout
+    def select(results):
+        out = {}
+        for k in keys:
+            src, dst = results[k], out.setdefault(k, {})
+            for part in path[:-1]:
+                src, dst = src[part], dst.setdefault(part, {})
+            dst[path[-1]] = src[path[-1]]
+        return out
+    return select
+
+
+def _merge(*selectors):
+    def select(results):
+        out = {}
+        for sel in selectors:
+            for k, v in sel(results).items():
+                for part, sub in v.items():
+                    out.setdefault(k, {}).setdefault(part, {}).update(sub)
+        return out
+    return select
+
+
+@figure("fig1_impacts", _merge(_pick("summary", "total_water"), _pick("summary", "total_energy")))
 def fig_impact_bar(results):
+    plt = _pyplot()
     keys = ["S1", "S2", "S3"]
     labels = ["S1 (Base)", "S2 (Tax)", "S3 (Fair)"]
 
@@ -38,7 +105,9 @@ def fig_impact_bar(results):
     save_fig(fig, "fig1_impacts")
 
 
+@figure("fig2_market_share", _pick("groups"))
 def fig_market_share(results):
+    plt = _pyplot()
     keys = ["S1", "S2", "S3"]
     labels = ["S1 (Base)", "S2 (Tax)", "S3 (Fair)"]
 
@@ -59,7 +128,9 @@ def fig_market_share(results):
     save_fig(fig, "fig2_market_share")
 
 
+@figure("fig3_gini_inequality", _pick("summary", "share_gini"))
 def fig_gini(results):
+    plt = _pyplot()
     keys = ["S1", "S2", "S3"]
     labels = ["S1 (Base)", "S2 (Tax)", "S3 (Fair)"]
     gini = [results[k]["summary"]["share_gini"] for k in keys]
@@ -82,7 +153,9 @@ def fig_gini(results):
 
 # --- NEW FUNCTIONS FOR FIGURES 5 & 6 ---
 
+@figure("fig5_security_timeseries", _pick("timeseries", "supply", keys=["S1", "S3"]))
 def fig_security_timeseries(results):
+    plt = _pyplot()
     # FIG 5: Shows the "Winter Collapse"
     # S1 should crash at t=80. S3 should stay stable.
 
@@ -113,7 +186,9 @@ def fig_security_timeseries(results):
     save_fig(fig, "fig5_security_timeseries")
 
 
+@figure("fig6_waste_analysis", _pick("summary", "total_waste"))
 def fig_waste_bar(results):
+    plt = _pyplot()
     # FIG 6: Shows Waste (Spoilage)
     # S1 should be high (long distance). S3 should be lower (local mix).
 
@@ -136,12 +211,104 @@ def fig_waste_bar(results):
     save_fig(fig, "fig6_waste_analysis")
 
 
+@figure("fig4_sensitivity", lambda results: results["sensitivity"])
+def fig_sensitivity(data):
+    # FIG 4: Pareto frontier from run_sensitivity (gamma vs Gini and cost)
+    plt = _pyplot()
+    gammas, results_gini, results_cost = data["gamma"], data["gini"], data["cost"]
+
+    fig, ax1 = plt.subplots(figsize=(8, 5))
+
+    color = 'tab:red'
+    ax1.set_xlabel('Fairness Weight (Gamma)')
+    ax1.set_ylabel('Market Inequality (Gini)', color=color)
+    ax1.plot(gammas, results_gini, color=color, marker='o', label="Inequality")
+    ax1.tick_params(axis='y', labelcolor=color)
+
+    ax2 = ax1.twinx()
+    color = 'tab:blue'
+    ax2.set_ylabel('Avg Procurement Cost ($)', color=color)
+    ax2.plot(gammas, results_cost, color=color, marker='s', linestyle='--', label="Cost")
+    ax2.tick_params(axis='y', labelcolor=color)
+
+    ax1.set_title("Sensitivity Analysis: The Cost of Fairness")
+    ax1.grid(True, alpha=0.3)
+    fig.tight_layout()
+    save_fig(fig, "fig4_sensitivity")
+
+
+# =========================
+#  RENDERING
+# =========================
+
+def _figure_hash(name: str, data: Any) -> str:
+    # Changes when either the input slice or the renderer's code changes
+    fn, _ = FIGURES[name]
+    h = hashlib.sha1(json.dumps(data, sort_keys=True, default=float).encode("utf-8"))
+    h.update(inspect.getsource(fn).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _render_one(name: str, data: Any) -> str:
+    fn, _ = FIGURES[name]
+    fn(data)
+    return name
+
+
+def render_figures(results: Dict[str, Any], names: Optional[List[str]] = None,
+                   workers: Optional[int] = None, force: bool = False) -> List[str]:
+    """
+    Render registered figures whose input data changed since the last render.
+    Figures whose inputs are missing from `results` are skipped. With more than
+    one stale figure they are rendered in parallel worker processes.
+    Returns the names that were rendered.
+    """
+    try:
+        with open(HASH_FILE, "r") as f:
+            old_hashes = json.load(f)
+    except (OSError, ValueError):
+        old_hashes = {}
+
+    stale = {}
+    new_hashes = dict(old_hashes)
+    for name in (names or list(FIGURES)):
+        _, select = FIGURES[name]
+        try:
+            data = select(results)
+        except KeyError:
+            continue
+        h = _figure_hash(name, data)
+        png = os.path.join(FIG_DIR, f"{name}.png")
+        if force or old_hashes.get(name) != h or not os.path.exists(png):
+            stale[name] = data
+            new_hashes[name] = h
+
+    if not stale:
+        return []
+
+    workers = workers if workers is not None else min(len(stale), os.cpu_count() or 1)
+    if workers > 1 and len(stale) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_render_one, stale.keys(), stale.values()))
+    else:
+        done = [_render_one(name, data) for name, data in stale.items()]
+
+    os.makedirs(FIG_DIR, exist_ok=True)
+    with open(HASH_FILE, "w") as f:
+        json.dump(new_hashes, f, indent=2, sort_keys=True)
+    return done
+
+
 if __name__ == "__main__":
-    results = load_results()
+    parser = argparse.ArgumentParser(description="Render figures from results.json or a results database")
+    parser.add_argument("path", nargs="?", default="results.json")
+    parser.add_argument("--only", nargs="+", default=None, choices=sorted(FIGURES), help="Figures to render")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Re-render even if inputs are unchanged")
+    args = parser.parse_args()
+
+    results = load_results(args.path)
     print("Generating figures...")
-    fig_impact_bar(results)
-    fig_market_share(results)
-    fig_gini(results)
-    fig_security_timeseries(results)  # <--- NEW
-    fig_waste_bar(results)  # <--- NEW
-    print("Done! Figures saved to figures/ folder.")
\ No newline at end of file
+    rendered = render_figures(results, names=args.only, workers=args.workers, force=args.force)
+    print(f"Rendered {len(rendered)} figure(s): {', '.join(rendered) or 'all up to date'}")
+    print("Done! Figures saved to figures/ folder.")
@@ -0,0 +1,361 @@
+import argparse
+import csv
+import json
+import os
+from collections.abc import MutableMapping
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+import numpy as np
+
+from simulation import Supplier, Buyer
+
+
+# =========================
+#  ON-DISK FORMAT
+# =========================
+#
+# A population is a directory:
+#   header.json          format/version, counts, group names, array dtypes+shapes
+#   <column>.npy         one fixed-width array per attribute (see below)
+#   distances.npy        n_suppliers x n_buyers matrix (km), NaN = no route known
+#
+# Every .npy is opened with mmap_mode="r", so opening a multi-GB population
+# only reads the header and the pages that are actually touched.
+
+FORMAT = "ecofair-population"
+VERSION = 1
+
+SUPPLIER_FLOAT_COLUMNS = ["c", "water_footprint", "energy_footprint", "cap_nominal",
+                          "reputation", "weather_susceptibility", "x", "y"]
+BUYER_FLOAT_COLUMNS = ["demand_nominal", "x", "y"]
+
+
+def _group_of(supplier_id: str) -> str:
+    # create_farmers_AB ids look like "Indoor_1" / "Outdoor_3"
+    return supplier_id.split("_", 1)[0]
+
+
+class DistanceRow(MutableMapping):
+    """
+    Supplier.distances backed by row `index` of the (memory-mapped) distance
+    matrix. Writes (e.g. SpatialIndex filling in missing distances) go to a
+    small overlay. Pickling (e.g. to a shard process) ships only the row.
+    """
+
+    __slots__ = ("matrix", "index", "row", "buyer_index", "overlay")
+
+    def __init__(self, matrix: np.ndarray, index: int, buyer_index: Dict[str, int]):
+        self.matrix = matrix
+        self.index = index
+        self.row = matrix[index]
+        self.buyer_index = buyer_index
+        self.overlay: Dict[str, float] = {}
+
+    def __getstate__(self):
+        return {"row": np.array(self.row), "buyer_index": self.buyer_index, "overlay": self.overlay}
+
+    def __setstate__(self, state) -> None:
+        row = state["row"]
+        self.matrix, self.index, self.row = row[None, :], 0, row
+        self.buyer_index = state["buyer_index"]
+        self.overlay = state["overlay"]
+
+    def __getitem__(self, buyer_id: str) -> float:
+        if buyer_id in self.overlay:
+            return self.overlay[buyer_id]
+        j = self.buyer_index[buyer_id]
+        d = float(self.row[j])
+        if d != d:  # NaN: no distance stored
+            raise KeyError(buyer_id)
+        return d
+
+    def __setitem__(self, buyer_id: str, value: float) -> None:
+        self.overlay[buyer_id] = value
+
+    def __delitem__(self, buyer_id: str) -> None:
+        del self.overlay[buyer_id]
+
+    def __iter__(self) -> Iterator[str]:
+        for b, j in self.buyer_index.items():
+            if b in self.overlay or self.row[j] == self.row[j]:
+                yield b
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class Population:
+    """Columnar population opened from disk. Arrays are read-only memory maps."""
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        with open(os.path.join(path, "header.json"), "r") as f:
+            self.header = json.load(f)
+        if self.header.get("format") != FORMAT:
+            raise ValueError(f"{path} is not an {FORMAT} bundle")
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"Unsupported population version {self.header.get('version')}")
+        mode = "r" if mmap else None
+        self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                       for name in self.header["arrays"]}
+        self.groups: List[str] = self.header["groups"]
+        self.n_suppliers = self.header["n_suppliers"]
+        self.n_buyers = self.header["n_buyers"]
+        self._buyer_index: Optional[Dict[str, int]] = None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    @property
+    def distances(self) -> np.ndarray:
+        return self.arrays["distances"]
+
+    @property
+    def buyer_index(self) -> Dict[str, int]:
+        if self._buyer_index is None:
+            ids = self.arrays["buyer_id"]
+            self._buyer_index = {ids[j].decode(): j for j in range(self.n_buyers)}
+        return self._buyer_index
+
+    def supplier(self, i: int) -> Supplier:
+        a = self.arrays
+        x, y = float(a["supplier_x"][i]), float(a["supplier_y"][i])
+        return Supplier(
+            id=a["supplier_id"][i].decode(),
+            c=float(a["supplier_c"][i]),
+            water_footprint=float(a["supplier_water_footprint"][i]),
+            energy_footprint=float(a["supplier_energy_footprint"][i]),
+            cap_nominal=float(a["supplier_cap_nominal"][i]),
+            distances=DistanceRow(a["distances"], i, self.buyer_index),
+            reputation=float(a["supplier_reputation"][i]),
+            weather_susceptibility=float(a["supplier_weather_susceptibility"][i]),
+            is_seasonal=bool(a["supplier_is_seasonal"][i]),
+            x=None if x != x else x,
+            y=None if y != y else y,
+        )
+
+    def suppliers(self, indices: Optional[List[int]] = None) -> List[Supplier]:
+        """Materialise Supplier agents (all, or a subset such as one region)."""
+        if indices is None:
+            indices = range(self.n_suppliers)
+        return [self.supplier(i) for i in indices]
+
+    def buyers(self, indices: Optional[List[int]] = None) -> List[Buyer]:
+        a = self.arrays
+        out = []
+        for j in (range(self.n_buyers) if indices is None else indices):
+            x, y = float(a["buyer_x"][j]), float(a["buyer_y"][j])
+            out.append(Buyer(id=a["buyer_id"][j].decode(), demand_nominal=float(a["buyer_demand_nominal"][j]),
+                             x=None if x != x else x, y=None if y != y else y))
+        return out
+
+    def group_of(self, i: int) -> str:
+        return self.groups[int(self.arrays["supplier_group"][i])]
+
+
+def load_population(path: str, mmap: bool = True) -> Population:
+    return Population(path, mmap=mmap)
+
+
+# =========================
+#  WRITERS
+# =========================
+
+class _BundleWriter:
+    """Preallocates every column as an .npy memmap so writers can fill it chunk by chunk."""
+
+    def __init__(self, path: str, n_suppliers: int, n_buyers: int, id_width: int,
+                 distance_dtype: str = "float32"):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.header: Dict[str, Any] = {"format": FORMAT, "version": VERSION, "n_suppliers": n_suppliers,
+                                       "n_buyers": n_buyers, "groups": [], "arrays": {}}
+        self.cols: Dict[str, np.ndarray] = {}
+        self._group_codes: Dict[str, int] = {}
+
+        self._alloc("supplier_id", (n_suppliers,), f"S{id_width}")
+        for c in SUPPLIER_FLOAT_COLUMNS:
+            self._alloc(f"supplier_{c}", (n_suppliers,), "float64")
+        self._alloc("supplier_is_seasonal", (n_suppliers,), "bool")
+        self._alloc("supplier_group", (n_suppliers,), "uint8")
+        self._alloc("buyer_id", (n_buyers,), f"S{id_width}")
+        for c in BUYER_FLOAT_COLUMNS:
+            self._alloc(f"buyer_{c}", (n_buyers,), "float64")
+        self._alloc("distances", (n_suppliers, n_buyers), distance_dtype)
+        self.cols["distances"][:] = np.nan
+
+    def _alloc(self, name, shape, dtype):
+        self.cols[name] = np.lib.format.open_memmap(os.path.join(self.path, f"{name}.npy"), mode="w+",
+                                                    dtype=dtype, shape=shape)
+        self.header["arrays"][name] = {"dtype": str(np.dtype(dtype)), "shape": list(shape)}
+
+    def group_code(self, group: str) -> int:
+        if group not in self._group_codes:
+            if len(self._group_codes) >= 255:
+                raise ValueError("At most 255 supplier groups are supported")
+            self._group_codes[group] = len(self._group_codes)
+            self.header["groups"].append(group)
+        return self._group_codes[group]
+
+    def close(self) -> None:
+        for arr in self.cols.values():
+            arr.flush()
+        with open(os.path.join(self.path, "header.json"), "w") as f:
+            json.dump(self.header, f, indent=2)
+
+
+def _nan_if_none(v):
+    return np.nan if v is None else v
+
+
+def save_population(path: str, suppliers: List[Supplier], buyers: List[Buyer],
+                    distance_dtype: str = "float32") -> None:
+    """Write in-memory agents (e.g. create_farmers_AB) to a population bundle."""
+    id_width = max([len(s.id) for s in suppliers] + [len(b.id) for b in buyers] + [1])
+    w = _BundleWriter(path, len(suppliers), len(buyers), id_width, distance_dtype)
+    buyer_index = {b.id: j for j, b in enumerate(buyers)}
+
+    for j, b in enumerate(buyers):
+        w.cols["buyer_id"][j] = b.id.encode()
+        w.cols["buyer_demand_nominal"][j] = b.demand_nominal
+        w.cols["buyer_x"][j] = _nan_if_none(b.x)
+        w.cols["buyer_y"][j] = _nan_if_none(b.y)
+
+    for i, s in enumerate(suppliers):
+        w.cols["supplier_id"][i] = s.id.encode()
+        for c in SUPPLIER_FLOAT_COLUMNS:
+            w.cols[f"supplier_{c}"][i] = _nan_if_none(getattr(s, c))
+        w.cols["supplier_is_seasonal"][i] = s.is_seasonal
+        w.cols["supplier_group"][i] = w.group_code(_group_of(s.id))
+        for bid, d in s.distances.items():
+            if bid in buyer_index:
+                w.cols["distances"][i, buyer_index[bid]] = d
+    w.close()
+
+
+def _records(f, path: str):
+    """csv.DictReader over `f` that rejects records whose column count differs from the header."""
+    reader = csv.DictReader(f)
+    for row in reader:
+        if None in row or None in row.values():
+            n = len(reader.fieldnames) + len(row.get(None, ())) - sum(v is None for v in row.values())
+            raise ValueError(f"{path}, line {reader.line_num}: expected {len(reader.fieldnames)} columns, got {n}")
+        yield row
+
+
+def _scan(path: str, column: str) -> Tuple[int, int]:
+    """(number of CSV records, longest value in `column`) in one pass.
+    Counts records as csv parses them, so blank lines and quoted newlines
+    do not turn into extra rows."""
+    n, width = 0, 1
+    with open(path, "r", newline="") as f:
+        for row in _records(f, path):
+            n += 1
+            width = max(width, len(row[column]))
+    return n, width
+
+
+def import_csv(out_path: str, suppliers_csv: str, buyers_csv: str, distances_csv: Optional[str] = None,
+               chunk_rows: int = 100_000, distance_dtype: str = "float32") -> None:
+    """
+    Stream CSVs into a population bundle without holding them in memory.
+
+    suppliers_csv: id,c,water_footprint,energy_footprint,cap_nominal[,reputation,
+                   weather_susceptibility,is_seasonal,group,x,y]
+    buyers_csv:    id,demand_nominal[,x,y]
+    distances_csv: supplier_id,buyer_id,distance   (long format, any order)
+
+    Rows are parsed and written to the memory-mapped columns `chunk_rows` at a time.
+    """
+    (n_s, s_width), (n_b, b_width) = _scan(suppliers_csv, "id"), _scan(buyers_csv, "id")
+    id_width = max(s_width, b_width)
+    w = _BundleWriter(out_path, n_s, n_b, id_width, distance_dtype)
+
+    defaults = {"reputation": 1.0, "weather_susceptibility": 0.0, "x": np.nan, "y": np.nan}
+
+    def _float(row, col):
+        v = row.get(col)
+        return float(v) if v not in (None, "") else defaults[col]
+
+    supplier_index: Dict[str, int] = {}
+    with open(suppliers_csv, "r", newline="") as f:
+        reader = _records(f, suppliers_csv)
+        start = 0
+        while True:
+            chunk = [row for _, row in zip(range(chunk_rows), reader)]
+            if not chunk:
+                break
+            sl = slice(start, start + len(chunk))
+            w.cols["supplier_id"][sl] = [r["id"].encode() for r in chunk]
+            for c in SUPPLIER_FLOAT_COLUMNS:
+                if c in defaults:
+                    w.cols[f"supplier_{c}"][sl] = [_float(r, c) for r in chunk]
+                else:
+                    w.cols[f"supplier_{c}"][sl] = [float(r[c]) for r in chunk]
+            w.cols["supplier_is_seasonal"][sl] = [r.get("is_seasonal", "").strip().lower() in ("1", "true", "yes")
+                                                  for r in chunk]
+            w.cols["supplier_group"][sl] = [w.group_code(r.get("group") or _group_of(r["id"])) for r in chunk]
+            for k, r in enumerate(chunk):
+                supplier_index[r["id"]] = start + k
+            start += len(chunk)
+
+    if start != n_s:
+        raise ValueError(f"{suppliers_csv}: counted {n_s} suppliers but read {start}")
+
+    buyer_index: Dict[str, int] = {}
+    n_read = 0
+    with open(buyers_csv, "r", newline="") as f:
+        for j, r in enumerate(_records(f, buyers_csv)):
+            n_read += 1
+            buyer_index[r["id"]] = j
+            w.cols["buyer_id"][j] = r["id"].encode()
+            w.cols["buyer_demand_nominal"][j] = float(r["demand_nominal"])
+            w.cols["buyer_x"][j] = _float(r, "x")
+            w.cols["buyer_y"][j] = _float(r, "y")
+    if n_read != n_b:
+        raise ValueError(f"{buyers_csv}: counted {n_b} buyers but read {n_read}")
+
+    if distances_csv:
+        dist = w.cols["distances"]
+        with open(distances_csv, "r", newline="") as f:
+            reader = _records(f, distances_csv)
+            while True:
+                chunk = [row for _, row in zip(range(chunk_rows), reader)]
+                if not chunk:
+                    break
+                rows = np.fromiter((supplier_index[r["supplier_id"]] for r in chunk), dtype=np.int64, count=len(chunk))
+                cols = np.fromiter((buyer_index[r["buyer_id"]] for r in chunk), dtype=np.int64, count=len(chunk))
+                dist[rows, cols] = np.fromiter((float(r["distance"]) for r in chunk), dtype=np.float64, count=len(chunk))
+    w.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect a columnar population bundle")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_imp = sub.add_parser("import", help="Stream suppliers/buyers/distances CSVs into a bundle")
+    p_imp.add_argument("out")
+    p_imp.add_argument("--suppliers", required=True)
+    p_imp.add_argument("--buyers", required=True)
+    p_imp.add_argument("--distances", default=None)
+    p_imp.add_argument("--chunk-rows", type=int, default=100_000)
+
+    p_ab = sub.add_parser("example", help="Write the create_farmers_AB population")
+    p_ab.add_argument("out")
+
+    p_info = sub.add_parser("info", help="Print the header of a bundle")
+    p_info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_csv(args.out, args.suppliers, args.buyers, args.distances, chunk_rows=args.chunk_rows)
+        print(f"Wrote {args.out}")
+    elif args.command == "example":
+        from simulation import create_farmers_AB, create_example_buyer
+        save_population(args.out, create_farmers_AB(), [create_example_buyer()])
+        print(f"Wrote {args.out}")
+    else:
+        pop = load_population(args.path)
+        print(f"{pop.n_suppliers} suppliers, {pop.n_buyers} buyers, groups={pop.groups}")
+        for name, meta in pop.header["arrays"].items():
+            print(f"  {name:<32} {meta['dtype']:<8} {meta['shape']}")
@@ -0,0 +1,162 @@
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+# Stage names used by Simulation.run, in execution order
+STAGES = [
+    "capacity_reset",
+    "filter",
+    "rank",
+    "allocate",
+    "spoilage",
+    "fairness_update",
+    "emissions",
+    "cost",
+    "log",
+]
+
+
+class _Stage:
+    """Timer for one named stage. Reused across rounds to keep the hot loop allocation-free."""
+
+    __slots__ = ("profiler", "name", "t0", "mem0")
+
+    def __init__(self, profiler: "StageProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.t0 = 0.0
+        self.mem0 = 0
+
+    def __enter__(self):
+        if self.profiler.track_memory:
+            # Peak since here, so memory allocated and freed within the stage still counts
+            tracemalloc.reset_peak()
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        stats = self.profiler.stats[self.name]
+        stats["seconds"] += elapsed
+        stats["calls"] += 1
+        if self.profiler.track_memory:
+            stats["alloc_bytes"] += tracemalloc.get_traced_memory()[1] - self.mem0
+        return False
+
+
+class StageProfiler:
+    """
+    Collects cumulative wall time, call counts and (optionally) allocated bytes per
+    simulation stage (peak traced memory above the stage's starting level, summed
+    over calls). Attach to Simulation.profiler; leave it as None to disable.
+    With use_cprofile=True the whole run is also recorded by cProfile so it can be
+    dumped for snakeviz / flameprof; its tracing slows every stage, so timings from
+    such a profiler are not representative.
+    """
+
+    def __init__(self, track_memory: bool = False, use_cprofile: bool = False):
+        self.track_memory = track_memory
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._stages: Dict[str, _Stage] = {}
+        self.runs = 0
+        self.run_seconds = 0.0
+        self.cprofile = cProfile.Profile() if use_cprofile else None
+        for name in STAGES:
+            self.stage(name)
+
+    def stage(self, name: str) -> _Stage:
+        st = self._stages.get(name)
+        if st is None:
+            st = self._stages[name] = _Stage(self, name)
+            self.stats[name] = {"seconds": 0.0, "calls": 0, "alloc_bytes": 0}
+        return st
+
+    @contextmanager
+    def session(self):
+        """Wraps one Simulation.run call."""
+        started_tracing = False
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        t0 = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.run_seconds += time.perf_counter() - t0
+            self.runs += 1
+            if self.cprofile is not None:
+                self.cprofile.disable()
+            if started_tracing:
+                tracemalloc.stop()
+
+    def report(self) -> Dict[str, Any]:
+        staged = sum(s["seconds"] for s in self.stats.values())
+        stages = {}
+        for name, s in self.stats.items():
+            stages[name] = {
+                "seconds": s["seconds"],
+                "calls": s["calls"],
+                "mean_us": 1e6 * s["seconds"] / s["calls"] if s["calls"] else 0.0,
+                "share": s["seconds"] / staged if staged > 0 else 0.0,
+            }
+            if self.track_memory:
+                stages[name]["alloc_bytes"] = s["alloc_bytes"]
+        return {
+            "runs": self.runs,
+            "run_seconds": self.run_seconds,
+            "staged_seconds": staged,
+            "stages": stages,
+        }
+
+    def format_table(self) -> str:
+        rep = self.report()
+        lines = [f"{'Stage':<16}{'Seconds':>10}{'Calls':>10}{'Mean (us)':>12}{'Share':>8}"]
+        for name, s in sorted(rep["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+            lines.append(f"{name:<16}{s['seconds']:>10.4f}{s['calls']:>10d}{s['mean_us']:>12.1f}{s['share']:>8.1%}")
+        lines.append(f"{rep['runs']} run(s), {rep['run_seconds']:.4f}s total")
+        return "\n".join(lines)
+
+    def to_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def dump_cprofile(self, path: str) -> None:
+        # pstats format: `snakeviz path` or `flameprof path > flame.svg`
+        if self.cprofile is None:
+            raise ValueError("StageProfiler was created without use_cprofile=True")
+        pstats.Stats(self.cprofile).dump_stats(path)
+
+
+def add_profile_arguments(parser) -> None:
+    parser.add_argument("--profile", metavar="PREFIX", default=None,
+                        help="Write stage timings to PREFIX.json")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Also track allocated bytes per stage (slower)")
+    parser.add_argument("--profile-cprofile", action="store_true",
+                        help="Also record a cProfile dump to PREFIX.prof (slows every stage, skews timings)")
+
+
+def profiler_from_args(args) -> Optional[StageProfiler]:
+    if not args.profile:
+        return None
+    return StageProfiler(track_memory=args.profile_memory, use_cprofile=args.profile_cprofile)
+
+
+def write_profile(profiler: Optional[StageProfiler], prefix: Optional[str]) -> None:
+    if profiler is None or not prefix:
+        return
+    profiler.to_json(f"{prefix}.json")
+    print(profiler.format_table())
+    if profiler.cprofile is not None:
+        profiler.dump_cprofile(f"{prefix}.prof")
+        print(f"Saved {prefix}.json and {prefix}.prof")
+    else:
+        print(f"Saved {prefix}.json")
@@ -0,0 +1,271 @@
+import dataclasses
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+from simulation import ScenarioConfig
+
+
+# =========================
+#  SCHEMA
+# =========================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    param_hash TEXT PRIMARY KEY,
+    name       TEXT NOT NULL,
+    config     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id       INTEGER PRIMARY KEY,
+    experiment   TEXT NOT NULL,
+    scenario_key TEXT NOT NULL,
+    param_hash   TEXT NOT NULL REFERENCES scenarios(param_hash),
+    seed         INTEGER NOT NULL,
+    created      REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    metric TEXT NOT NULL,
+    value  REAL,
+    PRIMARY KEY (run_id, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS timeseries (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    series TEXT NOT NULL,
+    t      INTEGER NOT NULL,
+    value  REAL,
+    PRIMARY KEY (run_id, series, t)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_runs_scenario ON runs(experiment, scenario_key, seed);
+CREATE INDEX IF NOT EXISTS idx_runs_hash ON runs(param_hash, seed);
+CREATE INDEX IF NOT EXISTS idx_summaries_metric ON summaries(metric, run_id);
+"""
+
+# Group shares are stored as summary rows with this prefix
+GROUP_PREFIX = "group:"
+
+# Filter lists longer than this are joined through a temp table instead of
+# IN (?, ...), which would hit SQLITE_MAX_VARIABLE_NUMBER (999 before 3.32)
+MAX_INLINE_PARAMS = 500
+
+
+# Config fields added after stores were in use, with the value that reproduces
+# the older behaviour. Left out of the hash at that value so existing
+# param_hashes stay valid.
+_HASH_DEFAULTS = {"reputation_smoothing": 0.0}
+
+
+def param_hash(scenario: ScenarioConfig) -> str:
+    """Stable hash of every config field except the display name."""
+    params = dataclasses.asdict(scenario)
+    params.pop("name", None)
+    for k, v in _HASH_DEFAULTS.items():
+        if params.get(k) == v:
+            params.pop(k)
+    blob = json.dumps(params, sort_keys=True, default=float)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+# =========================
+#  STORE
+# =========================
+
+class ResultsStore:
+    """
+    Embedded SQLite store for runs, scenario configs, summaries and time series.
+    Uses WAL mode with a busy timeout so several worker processes can insert
+    into the same file concurrently.
+    """
+
+    def __init__(self, path: str = "results.db", timeout: float = 60.0):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ---- writes ----
+
+    def insert_runs(self, records: Iterable[Tuple[ScenarioConfig, int, Dict[str, Any]]],
+                    experiment: str = "default") -> List[int]:
+        """
+        Bulk insert (scenario, seed, metrics) records in a single transaction.
+        `metrics` is the dict returned by extract_metrics.
+        """
+        run_ids = []
+        now = time.time()
+        with self.conn:
+            cur = self.conn.cursor()
+            for scenario, seed, metrics in records:
+                h = param_hash(scenario)
+                cur.execute(
+                    "INSERT OR IGNORE INTO scenarios (param_hash, name, config) VALUES (?, ?, ?)",
+                    (h, scenario.name, json.dumps(dataclasses.asdict(scenario), sort_keys=True)),
+                )
+                cur.execute(
+                    "INSERT INTO runs (experiment, scenario_key, param_hash, seed, created) VALUES (?, ?, ?, ?, ?)",
+                    (experiment, metrics["scenario_key"], h, int(seed), now),
+                )
+                run_id = cur.lastrowid
+                run_ids.append(run_id)
+
+                summary_rows = [(run_id, k, float(v)) for k, v in metrics["summary"].items()]
+                summary_rows += [(run_id, GROUP_PREFIX + g, float(v)) for g, v in metrics.get("groups", {}).items()]
+                cur.executemany("INSERT INTO summaries (run_id, metric, value) VALUES (?, ?, ?)", summary_rows)
+
+                ts_rows = []
+                for series, values in metrics.get("timeseries", {}).items():
+                    ts_rows += [(run_id, series, t, float(v)) for t, v in enumerate(values, start=1)]
+                cur.executemany("INSERT INTO timeseries (run_id, series, t, value) VALUES (?, ?, ?, ?)", ts_rows)
+        return run_ids
+
+    def insert_run(self, scenario: ScenarioConfig, seed: int, metrics: Dict[str, Any],
+                   experiment: str = "default") -> int:
+        return self.insert_runs([(scenario, seed, metrics)], experiment=experiment)[0]
+
+    # ---- queries ----
+
+    def _in(self, col: str, values, args: list) -> str:
+        """`col IN (...)` clause; long lists are loaded into a temp table (one per column) and selected from."""
+        values = list(values)
+        if len(values) <= MAX_INLINE_PARAMS:
+            args += values
+            return f"{col} IN ({','.join('?' * len(values))})"
+        table = "temp.in_" + col.replace(".", "_")
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (v PRIMARY KEY)")
+            self.conn.execute(f"DELETE FROM {table}")
+            self.conn.executemany(f"INSERT OR IGNORE INTO {table} (v) VALUES (?)", ((v,) for v in values))
+        return f"{col} IN (SELECT v FROM {table})"
+
+    def _run_filter(self, experiment=None, scenario_keys=None, seeds=None, param_hashes=None):
+        clauses, args = [], []
+        if experiment is not None:
+            clauses.append("r.experiment = ?")
+            args.append(experiment)
+        for col, values in (("r.scenario_key", scenario_keys), ("r.seed", seeds), ("r.param_hash", param_hashes)):
+            if values is not None:
+                clauses.append(self._in(col, values, args))
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, args
+
+    def query_runs(self, experiment=None, scenario_keys=None, seeds=None, param_hashes=None) -> List[Dict[str, Any]]:
+        where, args = self._run_filter(experiment, scenario_keys, seeds, param_hashes)
+        rows = self.conn.execute(
+            f"SELECT r.run_id, r.experiment, r.scenario_key, r.param_hash, r.seed, s.name "
+            f"FROM runs r JOIN scenarios s USING (param_hash) {where} ORDER BY r.run_id", args
+        ).fetchall()
+        keys = ("run_id", "experiment", "scenario_key", "param_hash", "seed", "scenario_name")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def query_summaries(self, metrics: Optional[List[str]] = None, experiment=None, scenario_keys=None,
+                        seeds=None, param_hashes=None) -> List[Dict[str, Any]]:
+        """One dict per run: run columns plus the requested summary metrics."""
+        where, args = self._run_filter(experiment, scenario_keys, seeds, param_hashes)
+        if metrics is not None:
+            where += (" AND " if where else "WHERE ") + self._in("m.metric", metrics, args)
+        rows = self.conn.execute(
+            f"SELECT r.run_id, r.experiment, r.scenario_key, r.param_hash, r.seed, m.metric, m.value "
+            f"FROM runs r JOIN summaries m USING (run_id) {where} ORDER BY r.run_id", args
+        ).fetchall()
+
+        by_run: Dict[int, Dict[str, Any]] = {}
+        for run_id, exp, key, h, seed, metric, value in rows:
+            rec = by_run.get(run_id)
+            if rec is None:
+                rec = by_run[run_id] = {"run_id": run_id, "experiment": exp, "scenario_key": key,
+                                        "param_hash": h, "seed": seed}
+            rec[metric] = value
+        return list(by_run.values())
+
+    def query_timeseries(self, series: str, run_ids: List[int]) -> Dict[int, List[float]]:
+        run_ids = list(run_ids)
+        if not run_ids:
+            return {}
+        args = [series]
+        rows = self.conn.execute(
+            f"SELECT run_id, value FROM timeseries WHERE series = ? AND {self._in('run_id', run_ids, args)} "
+            f"ORDER BY run_id, t", args
+        ).fetchall()
+        out: Dict[int, List[float]] = {rid: [] for rid in run_ids}
+        for rid, value in rows:
+            out[rid].append(value)
+        return out
+
+    def query_configs(self, param_hashes: Optional[List[str]] = None) -> Dict[str, ScenarioConfig]:
+        if param_hashes is None:
+            rows = self.conn.execute("SELECT param_hash, config FROM scenarios").fetchall()
+        else:
+            args = []
+            rows = self.conn.execute(
+                f"SELECT param_hash, config FROM scenarios WHERE {self._in('param_hash', param_hashes, args)}", args
+            ).fetchall()
+        return {h: ScenarioConfig(**json.loads(cfg)) for h, cfg in rows}
+
+    def load_results(self, experiment: str = "default", scenario_keys: Optional[List[str]] = None,
+                     seed: Optional[int] = None, timeseries: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Rebuild the results.json layout ({key: {summary, groups, timeseries}}) from
+        the store, taking the latest run per scenario (optionally for one seed).
+        """
+        runs = self.query_runs(experiment=experiment, scenario_keys=scenario_keys,
+                               seeds=None if seed is None else [seed])
+        latest: Dict[str, Dict[str, Any]] = {}
+        for run in runs:
+            latest[run["scenario_key"]] = run
+        if not latest:
+            return {}
+
+        run_ids = [run["run_id"] for run in latest.values()]
+        args = []
+        rows = self.conn.execute(
+            f"SELECT run_id, metric, value FROM summaries WHERE {self._in('run_id', run_ids, args)}", args
+        ).fetchall()
+
+        results = {}
+        by_id = {}
+        for key, run in latest.items():
+            results[key] = by_id[run["run_id"]] = {
+                "scenario_key": key,
+                "scenario_name": run["scenario_name"],
+                "summary": {},
+                "groups": {},
+                "timeseries": {},
+            }
+        for run_id, metric, value in rows:
+            if metric.startswith(GROUP_PREFIX):
+                by_id[run_id]["groups"][metric[len(GROUP_PREFIX):]] = value
+            else:
+                by_id[run_id]["summary"][metric] = value
+
+        if timeseries:
+            args = []
+            ts_rows = self.conn.execute(
+                f"SELECT run_id, series, value FROM timeseries WHERE {self._in('run_id', run_ids, args)} "
+                f"ORDER BY run_id, series, t", args
+            ).fetchall()
+            for run_id, series, value in ts_rows:
+                by_id[run_id]["timeseries"].setdefault(series, []).append(value)
+        return results
+
+
+def load_results(path: str = "results.json", **query) -> Dict[str, Dict[str, Any]]:
+    """Load results from either a results.json file or a ResultsStore database."""
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            return json.load(f)
+    with ResultsStore(path) as store:
+        return store.load_results(**query)
@@ -1,6 +1,8 @@
+import argparse
 import json
 import random
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List
 
 from simulation import (
     create_farmers_AB,
@@ -10,17 +12,55 @@ from simulation import (
     PolicyScoringModule,
     MarketplaceModule,
     Logger,
+    EventBus,
+    ScenarioConfig,
     Simulation,
+    SpatialIndex,
+    SPOILAGE_CAP_DISTANCE,
 )
 from scenarios import SCENARIOS
-from extract_metrics import extract_metrics
+from extract_metrics import extract_metrics, RunAccumulator
+from profiling import add_profile_arguments, profiler_from_args, write_profile
+from results_store import ResultsStore
+from population import load_population
+from commodities import CommodityMarket, CommoditySimulation, parse_crop
+import telemetry
 
-def run_one(scenario_key: str, seed: int = 42) -> Dict[str, Any]:
-    scenario = SCENARIOS[scenario_key]
+def run_one(scenario_key: str, seed: int = 42, profiler=None, weather=None, population=None,
+            radius=None, crops=None) -> Dict[str, Any]:
+    # `weather`: optional pre-drawn uniforms (simulation.weather_draws) shared
+    # across scenarios for common random numbers
+    return run_scenario(SCENARIOS[scenario_key], scenario_key, seed=seed, profiler=profiler, weather=weather,
+                        population=population, radius=radius, crops=crops)
 
+def run_scenario(scenario: ScenarioConfig, scenario_key: str, seed: int = 42, profiler=None, weather=None,
+                 headless: bool = False, population=None, radius=None, crops=None) -> Dict[str, Any]:
+    # Same as run_one for an arbitrary config. headless=True swaps the Logger for
+    # a RunAccumulator (no per-round copies, no emissions) for large sweeps.
+    # `population`: path to a population bundle (population.py) instead of create_farmers_AB
+    # `radius`: km searched around each buyer when the suppliers have x/y
+    # (default: the distance at which spoilage hits its cap)
+    # `crops`: list of commodities.Crop (or "name:spoilage:..." specs) to run the
+    # crop-indexed CommoditySimulation instead; one default crop reproduces Simulation
     random.seed(seed)
-    suppliers = create_farmers_AB()
-    buyers = [create_example_buyer()]
+    if population is not None:
+        pop = load_population(population)
+        suppliers = pop.suppliers()
+        buyers = pop.buyers()
+    else:
+        suppliers = create_farmers_AB()
+        buyers = [create_example_buyer()]
+
+    if crops is not None:
+        if profiler is not None:
+            raise ValueError("Stage profiling covers Simulation.run only, not CommoditySimulation")
+        crops = [parse_crop(c) if isinstance(c, str) else c for c in crops]
+        market = CommodityMarket.from_agents(suppliers, buyers, crops)
+        sim = CommoditySimulation(market, scenario, weather=weather).run()
+        tel = telemetry.current()
+        if tel is not None:
+            tel.add_rounds(scenario.T)
+        return {"scenario_key": scenario_key, "scenario_name": scenario.name, **sim.summary()}
 
     # Dummy environment (values are in Supplier now)
     env = EnvironmentalDataModule(
@@ -31,8 +71,22 @@ def run_one(scenario_key: str, seed: int = 42) -> Dict[str, Any]:
 
     fairness = FairnessModule(delta=scenario.delta, eps=1e-9, disp_cap=5.0)
     policy = PolicyScoringModule(scenario)
-    marketplace = MarketplaceModule(env, fairness, policy)
-    logger = Logger()
+    # Coordinate-bearing populations (e.g. bundles) get candidate pruning
+    index = None
+    if any(s.x is not None and s.y is not None for s in suppliers):
+        index = SpatialIndex(suppliers, buyers, radius=radius if radius is not None else SPOILAGE_CAP_DISTANCE)
+    marketplace = MarketplaceModule(env, fairness, policy, index)
+    events = EventBus()
+    # Built-in farms take ~50us per round, where even a per-round hook costs
+    # over 1%, so their rounds are counted per run; bundle runs report live
+    tel = telemetry.current()
+    if tel is not None and population is not None:
+        tel.attach(events)
+    if headless:
+        logger = RunAccumulator()
+        logger.attach(events)
+    else:
+        logger = Logger()
 
     sim = Simulation(
         suppliers=suppliers,
@@ -41,10 +95,15 @@ def run_one(scenario_key: str, seed: int = 42) -> Dict[str, Any]:
         fairness_module=fairness,
         policy_module=policy,
         marketplace=marketplace,
-        logger=logger,
+        logger=None if headless else logger,
         scenario=scenario,
+        profiler=profiler,
+        events=events,
+        weather=weather,
     )
     sim.run()
+    if tel is not None and population is None:
+        tel.add_rounds(scenario.T)
 
     return extract_metrics(
         scenario_key=scenario_key,
@@ -54,16 +113,89 @@ def run_one(scenario_key: str, seed: int = 42) -> Dict[str, Any]:
         seed=seed,
     )
 
-def run_all(seed: int = 42) -> Dict[str, Dict[str, Any]]:
+def run_all(seed: int = 42, profiler=None, population=None, radius=None, crops=None) -> Dict[str, Dict[str, Any]]:
     results = {}
+    tel = telemetry.current()
+    if tel is not None:
+        tel.plan(3)
     # Only run the relevant scenarios
     for key in ["S1", "S2", "S3"]:
         print(f"Running {key}...")
-        results[key] = run_one(key, seed=seed)
+        results[key] = run_one(key, seed=seed, profiler=profiler, population=population, radius=radius, crops=crops)
+        if tel is not None:
+            tel.run_done(results[key])
     return results
 
+def _run_task(task, profiler=None):
+    key, seed, population, radius, crops = task
+    return key, seed, run_one(key, seed=seed, profiler=profiler, population=population, radius=radius, crops=crops)
+
+def run_to_store(db_path: str, seeds: List[int], keys: List[str] = ("S1", "S2", "S3"),
+                 experiment: str = "default", workers: int = 1, population=None, profiler=None,
+                 radius=None, crops=None) -> int:
+    """Run every scenario x seed (in parallel when workers > 1) and bulk insert into a ResultsStore."""
+    if profiler is not None and workers > 1:
+        raise ValueError("A StageProfiler only sees its own process; profile with workers=1")
+    tasks = [(key, seed, population, radius, crops) for seed in seeds for key in keys]
+    tel = telemetry.current()
+    if tel is not None:
+        tel.plan(len(tasks))
+    done = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if pool is not None:
+            results = pool.map(_run_task, tasks, chunksize=max(1, len(tasks) // (4 * workers)))
+        else:
+            results = (_run_task(task, profiler) for task in tasks)
+        for item in results:
+            done.append(item)
+            if tel is not None:
+                tel.run_done(item[2])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    with ResultsStore(db_path) as store:
+        store.insert_runs(((SCENARIOS[key], seed, metrics) for key, seed, metrics in done), experiment=experiment)
+    return len(done)
+
 if __name__ == "__main__":
-    results = run_all(seed=42)
-    with open("results.json", "w") as f:
-        json.dump(results, f, indent=2)
-    print("Saved results.json")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run S1-S3 and save results.json")
+    parser.add_argument("--store", metavar="DB", default=None,
+                        help="Insert runs into a SQLite ResultsStore instead of writing results.json")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[42])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--experiment", default="default")
+    parser.add_argument("--population", metavar="PATH", default=None,
+                        help="Population bundle (population.py) to use instead of the built-in farms")
+    parser.add_argument("--radius", type=float, metavar="KM", default=None,
+                        help="Candidate search radius around each buyer for populations with coordinates "
+                             "(default: the spoilage cap distance)")
+    parser.add_argument("--crops", nargs="+", metavar="NAME[:SPOIL[:WEATHER[:WINTER]]]", default=None,
+                        help="Run the crop-indexed CommoditySimulation with these crops (spoilage factor, "
+                             "weather sensitivity, winter yield); every supplier grows and every buyer "
+                             "demands each crop. Crop sets are not part of the stored param_hash, so give "
+                             "such runs their own --experiment")
+    add_profile_arguments(parser)
+    telemetry.add_telemetry_argument(parser)
+    args = parser.parse_args()
+    if args.profile and args.store and args.workers > 1:
+        parser.error("--profile needs --workers 1 (stage timings are collected in this process)")
+    if args.profile and args.crops:
+        parser.error("--profile times Simulation.run stages; it does not apply with --crops")
+    crops = [parse_crop(c) for c in args.crops] if args.crops else None
+    profiler = profiler_from_args(args)
+    telemetry.configure(args.telemetry)
+
+    if args.store:
+        n = run_to_store(args.store, args.seeds, experiment=args.experiment, workers=args.workers,
+                         population=args.population, profiler=profiler, radius=args.radius, crops=crops)
+        print(f"Stored {n} runs in {args.store}")
+        write_profile(profiler, args.profile)
+    else:
+        results = run_all(seed=args.seeds[0], profiler=profiler, population=args.population, radius=args.radius,
+                          crops=crops)
+        with open("results.json", "w") as f:
+            json.dump(results, f, indent=2)
+        print("Saved results.json")
+        write_profile(profiler, args.profile)
\ No newline at end of file
@@ -1,30 +1,43 @@
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 import random
 from simulation import *
 from scenarios import SCENARIOS
-from extract_metrics import extract_metrics, gini
+from extract_metrics import extract_metrics, gini, RunAccumulator
+from profiling import add_profile_arguments, profiler_from_args, write_profile
+from results_store import ResultsStore
+import telemetry
 
 
-def run_sensitivity_sweep():
-    print("Running Sensitivity Analysis (Gamma 0.0 -> 1.0)...")
-
-    gammas = np.linspace(0.0, 1.0, 11)  # [0.0, 0.1, ... 1.0]
-    results_gini = []
-    results_cost = []
+GAMMAS = np.linspace(0.0, 1.0, 11)  # [0.0, 0.1, ... 1.0]
 
-    base_scenario = SCENARIOS["S3"]  # Use S3 as base, modify gamma
 
-    for g in gammas:
-        # Create temp scenario config
-        cfg = ScenarioConfig(
+def gamma_sweep_configs(gammas=GAMMAS):
+    # S3-like configs with only gamma varying (also used by workqueue.py)
+    return [
+        ScenarioConfig(
             name=f"Sens_G{g:.1f}", T=100,
             scarcity_cost_water=0.05, scarcity_cost_energy=0.10,
-            alpha=0.5, beta=0.2, gamma=g,  # <--- VARYING GAMMA
+            alpha=0.5, beta=0.2, gamma=float(g),  # <--- VARYING GAMMA
             use_individualized_lca=True, use_fairness=True,
             allocation_mode="proportional", delta=0.5
         )
+        for g in gammas
+    ]
+
+
+def run_sensitivity_sweep(profiler=None, store_path=None, plot=True):
+    print("Running Sensitivity Analysis (Gamma 0.0 -> 1.0)...")
 
+    gammas = GAMMAS
+    results_gini = []
+    results_cost = []
+    records = []  # (config, seed, metrics) for the ResultsStore
+    tel = telemetry.current()
+    if tel is not None:
+        tel.plan(len(gammas))
+
+    for g, cfg in zip(gammas, gamma_sweep_configs(gammas)):
         # Run Simulation
         random.seed(42)
         suppliers = create_farmers_AB()
@@ -34,39 +47,53 @@ def run_sensitivity_sweep():
         fair = FairnessModule(0.5)
         pol = PolicyScoringModule(cfg)
         mkt = MarketplaceModule(env, fair, pol)
-        log = Logger()
 
-        sim = Simulation(suppliers, buyers, env, fair, pol, mkt, log, cfg)
+        # Headless: only Gini and cost are needed, so skip the full Logger
+        events = EventBus()
+        log = RunAccumulator()
+        log.attach(events)
+
+        sim = Simulation(suppliers, buyers, env, fair, pol, mkt, None, cfg, profiler=profiler, events=events)
         sim.run()
+        if tel is not None:
+            tel.add_rounds(cfg.T)
 
         # Extract Gini & Cost
-        metrics = extract_metrics("temp", cfg, suppliers, log, 42)
+        metrics = extract_metrics("S3_gamma", cfg, suppliers, log, 42)
+        records.append((cfg, 42, metrics))
+        if tel is not None:
+            tel.run_done(metrics)
         results_gini.append(metrics["summary"]["share_gini"])
         results_cost.append(metrics["summary"]["cost_mean"])
 
         print(f"Gamma={g:.1f} -> Gini={results_gini[-1]:.3f}, Cost={results_cost[-1]:.0f}")
 
-    # PLOT PARETO FRONTIER
-    fig, ax1 = plt.subplots(figsize=(8, 5))
+    if store_path:
+        with ResultsStore(store_path) as store:
+            store.insert_runs(records, experiment="gamma_sweep")
+        print(f"Stored {len(records)} sweep runs in {store_path}")
 
-    color = 'tab:red'
-    ax1.set_xlabel('Fairness Weight (Gamma)')
-    ax1.set_ylabel('Market Inequality (Gini)', color=color)
-    ax1.plot(gammas, results_gini, color=color, marker='o', label="Inequality")
-    ax1.tick_params(axis='y', labelcolor=color)
-
-    ax2 = ax1.twinx()
-    color = 'tab:blue'
-    ax2.set_ylabel('Avg Procurement Cost ($)', color=color)
-    ax2.plot(gammas, results_cost, color=color, marker='s', linestyle='--', label="Cost")
-    ax2.tick_params(axis='y', labelcolor=color)
-
-    plt.title("Sensitivity Analysis: The Cost of Fairness")
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    plt.savefig("figures/fig4_sensitivity.png", dpi=300)
-    print("Saved figures/fig4_sensitivity.png")
+    # PLOT PARETO FRONTIER (matplotlib is only imported if we actually plot)
+    if plot:
+        from plot_results import render_figures
+        data = {"gamma": [float(g) for g in gammas], "gini": results_gini, "cost": results_cost}
+        if render_figures({"sensitivity": data}, names=["fig4_sensitivity"], workers=1):
+            print("Saved figures/fig4_sensitivity.png")
+        else:
+            print("figures/fig4_sensitivity.png is up to date")
 
+    return {"gamma": list(gammas), "gini": results_gini, "cost": results_cost}
 
 if __name__ == "__main__":
-    run_sensitivity_sweep()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="One-at-a-time gamma sweep")
+    parser.add_argument("--store", metavar="DB", default=None,
+                        help="Also insert every sweep point into a SQLite ResultsStore")
+    parser.add_argument("--no-plot", action="store_true", help="Print the numbers only (matplotlib is not imported)")
+    add_profile_arguments(parser)
+    telemetry.add_telemetry_argument(parser)
+    args = parser.parse_args()
+    profiler = profiler_from_args(args)
+    telemetry.configure(args.telemetry)
+
+    run_sensitivity_sweep(profiler=profiler, store_path=args.store, plot=not args.no_plot)
+    write_profile(profiler, args.profile)
\ No newline at end of file
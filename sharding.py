@@ -0,0 +1,305 @@
+import math
+import multiprocessing as mp
+import random
+from fractions import Fraction
+from typing import Dict, Any, List, Optional, Tuple
+
+from simulation import (
+    Supplier,
+    Buyer,
+    ScenarioConfig,
+    SpatialIndex,
+    EnvironmentalDataModule,
+    FairnessModule,
+    PolicyScoringModule,
+    MarketplaceModule,
+    DeliveryModule,
+    EventBus,
+    weather_from_uniform,
+)
+
+
+# =========================
+#  SHARD WORKER
+# =========================
+#
+# Each shard owns the suppliers of one region plus the "local" buyers whose
+# candidate suppliers all live in that region. Buyers whose candidates span
+# regions ("boundary" buyers) are cleared by the coordinator in global buyer
+# order, against a snapshot of the candidate suppliers exported by the shards,
+# with capacity updates sent back. Per round only these boundary syncs, the
+# fairness totals (exact Fraction sums of Q) and the waste of each boundary
+# delivery cross process boundaries. A boundary buyer's waste is summed by the
+# coordinator in the round's allocation order, as the unsharded DeliveryModule
+# does, rather than by adding up per-shard partial sums.
+
+def _clear(marketplace, policy, scenario, eligible, buyer) -> Dict[Tuple[str, str], float]:
+    if scenario.allocation_mode == "sequential":
+        ranked = marketplace.rank_suppliers(eligible, buyer)
+        return marketplace.allocate_sequential(ranked, buyer)
+    scores = policy.compute_scores(eligible, buyer)
+    return marketplace.allocate_proportional(eligible, buyer, scores)
+
+
+class _Shard:
+    def __init__(self, suppliers: List[Supplier], buyers: List[Tuple[int, Buyer]], buyer_ids: List[str],
+                 scenario: ScenarioConfig, radius: Optional[float], fairness_params: Dict[str, float]):
+        self.suppliers = suppliers
+        self.s_map = {s.id: s for s in suppliers}
+        self.buyers = buyers  # (global index, Buyer), in global order
+        self.local_idx = {idx for idx, _ in buyers}
+        self.scenario = scenario
+        index = SpatialIndex(suppliers, [b for _, b in buyers], radius=radius) if radius is not None else None
+        self.fairness = FairnessModule(**fairness_params)
+        self.policy = PolicyScoringModule(scenario)
+        self.marketplace = MarketplaceModule(EnvironmentalDataModule(0.0, {}, 0.0), self.fairness, self.policy, index)
+        # All buyer ids: boundary buyers also take deliveries from this shard
+        self.delivery = DeliveryModule(suppliers, buyer_ids, smoothing=scenario.reputation_smoothing)
+
+    def start_round(self, t: int, severity: float) -> None:
+        for s in self.suppliers:
+            s.reset_capacity(t, severity, self.scenario.T)
+        self.next_buyer = 0
+        self.by_buyer: Dict[int, Dict[Tuple[str, str], float]] = {}
+
+    def clear_until(self, k: float) -> None:
+        """Clear local buyers whose global index is below k."""
+        while self.next_buyer < len(self.buyers) and self.buyers[self.next_buyer][0] < k:
+            idx, buyer = self.buyers[self.next_buyer]
+            buyer.reset_demand()
+            eligible = self.marketplace.filter_suppliers(self.suppliers, buyer)
+            self.by_buyer[idx] = _clear(self.marketplace, self.policy, self.scenario, eligible, buyer)
+            self.next_buyer += 1
+
+    def export(self, sids: List[str]) -> List[Supplier]:
+        # Scoring only reads these fields; skip the distance maps
+        out = []
+        for sid in sids:
+            s = self.s_map[sid]
+            out.append(Supplier(id=s.id, c=s.c, water_footprint=s.water_footprint,
+                                energy_footprint=s.energy_footprint, cap_nominal=s.cap_nominal, distances={},
+                                reputation=s.reputation, F_unified=s.F_unified, cap_available=s.cap_available))
+        return out
+
+    def apply(self, idx: int, allocations: List[Tuple[str, str, float, float]]) -> None:
+        """Boundary buyer result: (sid, bid, q, cap_available after) for this shard's suppliers."""
+        mine = {}
+        for sid, bid, q, cap_after in allocations:
+            self.s_map[sid].cap_available = cap_after
+            mine[(sid, bid)] = q
+        self.by_buyer[idx] = mine
+
+    def finish_round(self):
+        """(local buyer allocations, waste of each boundary buyer's deliveries from here,
+        total Q or None when fairness is off)."""
+        self.clear_until(math.inf)
+        allocations = {}
+        order = sorted(self.by_buyer)
+        for idx in order:
+            allocations.update(self.by_buyer[idx])
+        waste = self.delivery.deliver(allocations)
+        self.delivery.sync_reputation(self.suppliers)
+        boundary_waste, k = {}, 0
+        for idx in order:
+            n = len(self.by_buyer[idx])
+            if idx not in self.local_idx:
+                boundary_waste[idx] = waste[k:k + n]
+            k += n
+        total_Q = None
+        if self.scenario.use_fairness:
+            self.fairness.accumulate(self.suppliers, allocations)
+            total_Q = sum((Fraction(s.Q) for s in self.suppliers), Fraction(0))
+        report = {idx: [(sid, bid, q, self.s_map[sid].c) for (sid, bid), q in alloc.items()]
+                  for idx, alloc in self.by_buyer.items() if idx in self.local_idx}
+        return report, boundary_waste, total_Q
+
+
+def _shard_main(conn, suppliers, buyers, buyer_ids, scenario, radius, fairness_params):
+    shard = _Shard(suppliers, buyers, buyer_ids, scenario, radius, fairness_params)
+    conn.send(sum((Fraction(s.cap_nominal) for s in shard.suppliers), Fraction(0)))
+    while True:
+        msg = conn.recv()
+        op = msg[0]
+        if op == "round":
+            shard.start_round(msg[1], msg[2])
+        elif op == "sync":
+            shard.clear_until(msg[1])
+            conn.send(shard.export(msg[2]))
+        elif op == "apply":
+            shard.apply(msg[1], msg[2])
+        elif op == "finish":
+            conn.send(shard.finish_round())
+        elif op == "disparity":
+            shard.fairness.apply_disparity(shard.suppliers, msg[1], msg[2])
+        elif op == "collect":
+            shard.delivery.sync(shard.suppliers)
+            conn.send((shard.suppliers, shard.delivery.waste_by_buyer))
+        elif op == "stop":
+            conn.close()
+            return
+
+
+# =========================
+#  COORDINATOR
+# =========================
+
+class ShardedSimulation:
+    """
+    Simulation.run with suppliers and buyers partitioned by `region` across
+    worker processes. With the same spatial radius, weather and scenario it
+    produces exactly the allocations, waste and fairness state of the
+    unsharded Simulation (buyers are still cleared in global list order).
+
+    Supported events: weather, allocation, cost. run() returns the final
+    supplier states in the original order, ready for extract_metrics, and
+    sets each buyer's waste_received as Simulation.run does.
+    """
+
+    def __init__(self, suppliers: List[Supplier], buyers: List[Buyer], scenario: ScenarioConfig,
+                 radius: Optional[float] = None, events: Optional[EventBus] = None,
+                 weather: Optional[List[float]] = None, fairness: Optional[FairnessModule] = None):
+        self.scenario = scenario
+        self.radius = radius
+        self.events = events if events is not None else EventBus()
+        self.weather = weather
+        fairness = fairness or FairnessModule(delta=scenario.delta, eps=1e-9, disp_cap=5.0)
+        self.fairness_params = {"delta": fairness.delta, "eps": fairness.eps, "disp_cap": fairness.disp_cap}
+        self.policy = PolicyScoringModule(scenario)
+        self.marketplace = MarketplaceModule(EnvironmentalDataModule(0.0, {}, 0.0), fairness, self.policy)
+
+        for name in ("fairness", "emissions", "round_end"):
+            if self.events.wants(name):
+                raise ValueError(f"ShardedSimulation does not emit '{name}' events")
+
+        self.buyers = buyers
+        self.supplier_order = [s.id for s in suppliers]
+        self.region_of_supplier = {s.id: s.region for s in suppliers}
+        self.regions = sorted({s.region for s in suppliers}, key=str)
+
+        # Classify buyers once: local to the shard holding all of its candidate
+        # suppliers, whatever buyer.region says (a buyer without candidates
+        # stays in its own region, or goes to the first shard)
+        index = SpatialIndex(suppliers, buyers, radius=radius) if radius is not None else None
+        self.local: Dict[Any, List[Tuple[int, Buyer]]] = {r: [] for r in self.regions}
+        self.boundary: List[Tuple[int, Buyer, List[str], List[Any]]] = []
+        for idx, b in enumerate(buyers):
+            cands = index.candidates(b) if index is not None else suppliers
+            regions = {s.region for s in cands}
+            if not regions and self.regions:
+                self.local[b.region if b.region in self.local else self.regions[0]].append((idx, b))
+            elif len(regions) == 1:
+                self.local[regions.pop()].append((idx, b))
+            else:
+                sids = [s.id for s in cands]
+                self.boundary.append((idx, b, sids, sorted(regions, key=str)))
+
+        self._suppliers_by_region = {r: [s for s in suppliers if s.region == r] for r in self.regions}
+
+    def run(self) -> List[Supplier]:
+        T = self.scenario.T
+        ctx = mp.get_context()
+        conns, procs = {}, []
+        for r in self.regions:
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_shard_main, daemon=True,
+                            args=(child, self._suppliers_by_region[r], self.local[r], [b.id for b in self.buyers],
+                                  self.scenario, self.radius, self.fairness_params))
+            p.start()
+            conns[r], _ = parent, procs.append(p)
+
+        try:
+            total_Cap = float(sum((conns[r].recv() for r in self.regions), Fraction(0)))
+            events = self.events
+            boundary_waste = {idx: 0.0 for idx, _, _, _ in self.boundary}
+            want_weather = events.wants("weather")
+            want_allocation = events.wants("allocation")
+            want_cost = events.wants("cost")
+
+            for t in range(1, T + 1):
+                roll = self.weather[t - 1] if self.weather is not None else random.random()
+                severity = weather_from_uniform(roll)
+                if want_weather:
+                    events.emit("weather", t=t, severity=severity)
+                for r in self.regions:
+                    conns[r].send(("round", t, severity))
+
+                by_buyer = self._clear_boundary(conns)
+
+                total_Q = Fraction(0)
+                shipped = {}
+                for r in self.regions:
+                    conns[r].send(("finish",))
+                for r in self.regions:
+                    report, shipped[r], q_part = conns[r].recv()
+                    by_buyer.update(report)
+                    if q_part is not None:
+                        total_Q += q_part
+                self._add_boundary_waste(by_buyer, shipped, boundary_waste)
+
+                if self.scenario.use_fairness:
+                    for r in self.regions:
+                        conns[r].send(("disparity", float(total_Q), total_Cap))
+
+                # Rebuild the round's allocation dict in global buyer order
+                allocations, cost = {}, 0.0
+                for idx in sorted(by_buyer):
+                    for sid, bid, q, c in by_buyer[idx]:
+                        allocations[(sid, bid)] = q
+                        cost += q * c
+                if want_allocation:
+                    events.emit("allocation", t=t, allocations=allocations)
+                if want_cost:
+                    events.emit("cost", t=t, cost=cost)
+
+            final = {}
+            for r in self.regions:
+                conns[r].send(("collect",))
+                shard_suppliers, shard_waste = conns[r].recv()
+                for s in shard_suppliers:
+                    final[s.id] = s
+                for idx, b in self.local[r]:
+                    b.waste_received = float(shard_waste[idx])
+            for idx, b, _, _ in self.boundary:
+                b.waste_received = boundary_waste[idx]
+            return [final[sid] for sid in self.supplier_order]
+        finally:
+            for r in self.regions:
+                try:
+                    conns[r].send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+            for p in procs:
+                p.join(timeout=5)
+
+    def _add_boundary_waste(self, by_buyer, shipped, totals: Dict[int, float]) -> None:
+        # Walk each boundary buyer's allocations in order, taking every
+        # delivery's waste from the shard that owns its supplier
+        for idx, _, _, regions in self.boundary:
+            parts = {r: iter(shipped[r].get(idx, ())) for r in regions}
+            round_total = 0.0
+            for sid, _, _, _ in by_buyer[idx]:
+                round_total += next(parts[self.region_of_supplier[sid]])
+            totals[idx] += round_total
+
+    def _clear_boundary(self, conns) -> Dict[int, List[Tuple[str, str, float, float]]]:
+        by_buyer = {}
+        for idx, buyer, sids, regions in self.boundary:
+            for r in regions:
+                conns[r].send(("sync", idx, [sid for sid in sids if self.region_of_supplier[sid] == r]))
+            snapshot = {}
+            for r in regions:
+                for s in conns[r].recv():
+                    snapshot[s.id] = s
+            cands = [snapshot[sid] for sid in sids]  # global supplier order
+
+            buyer.reset_demand()
+            eligible = self.marketplace.filter_suppliers(cands)
+            alloc = _clear(self.marketplace, self.policy, self.scenario, eligible, buyer)
+
+            per_region = {r: [] for r in regions}
+            for (sid, bid), q in alloc.items():
+                per_region[self.region_of_supplier[sid]].append((sid, bid, q, snapshot[sid].cap_available))
+            for r in regions:
+                conns[r].send(("apply", idx, per_region[r]))
+            by_buyer[idx] = [(sid, bid, q, snapshot[sid].c) for (sid, bid), q in alloc.items()]
+        return by_buyer
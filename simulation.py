@@ -1,7 +1,25 @@
+from collections import defaultdict
 from dataclasses import dataclass, field
+from operator import itemgetter
 from typing import Dict, List, Optional, Tuple
+import math
 import random
 
+import numpy as np
+
+
+# Spoilage model: 5% loss per 100km, capped at 50%
+SPOILAGE_PER_100KM = 0.05
+SPOILAGE_CAP = 0.5
+# Beyond this distance every delivery hits the spoilage cap
+SPOILAGE_CAP_DISTANCE = 100.0 * SPOILAGE_CAP / SPOILAGE_PER_100KM
+
+# Weather model: each round draws u ~ U(0,1); u < 10% is a severe drought
+DROUGHT_PROBABILITY = 0.10
+DROUGHT_SEVERITY = 0.8
+# Seasonal (outdoor) farms drop to 10% yield from this share of the run on
+WINTER_START_FRACTION = 0.8
+
 
 # =========================
 #  AGENT DATA STRUCTURES
@@ -25,6 +43,11 @@ class Supplier:
     is_seasonal: bool = False  # Seasonality flag. True for Outdoor, False for Indoor
     waste_generated: float = 0.0  # Spoilage Tracking. To track how much food rotted
 
+    # 4. Location (optional, km grid). Used by SpatialIndex for candidate pruning
+    x: Optional[float] = None
+    y: Optional[float] = None
+    region: Optional[str] = None  # shard key for ShardedSimulation
+
     # Fairness state
     Q: float = 0.0  # cumulative allocated quantity Q_s
     F_rot: float = 0.0  # rotation fairness
@@ -42,26 +65,13 @@ class Supplier:
         # If seasonal (Outdoor), production drops to 10% during the last 20% of rounds (Winter)
         if self.is_seasonal:
             # Example: In a 100 round sim, Winter is rounds 80-100
-            winter_start = int(T_total * 0.8)
+            winter_start = int(T_total * WINTER_START_FRACTION)
             if t >= winter_start:
                 yield_factor *= 0.1  # Winter reduces yield by 90%
 
         # Ensure yield doesn't go below 0
         self.cap_available = self.cap_nominal * max(0.0, yield_factor)
 
-    def calculate_spoilage(self, buyer_id: str, quantity: float) -> float:
-        # Spoilage logic:
-        # 5% spoilage per 100km
-        dist = self.distances.get(buyer_id, 0.0)
-        spoilage_rate = (dist / 100.0) * 0.05
-
-        # Cap spoilage at 50% max
-        spoilage_rate = min(spoilage_rate, 0.5)
-
-        spoilage_amount = quantity * spoilage_rate
-        self.waste_generated += spoilage_amount
-        return spoilage_amount
-
 @dataclass
 class Buyer:
     id: str
@@ -70,6 +80,10 @@ class Buyer:
     w_e: float = 0.0
     w_f: float = 0.0
     demand_remaining: float = 0.0
+    waste_received: float = 0.0  # spoiled part of deliveries to this buyer
+    x: Optional[float] = None
+    y: Optional[float] = None
+    region: Optional[str] = None
 
     def reset_demand(self):
         self.demand_remaining = self.demand_nominal
@@ -98,6 +112,9 @@ class ScenarioConfig:
     use_fairness: bool
     allocation_mode: str
     delta: float = 0.5
+    # EWMA weight of each round's delivery quality (1 - spoiled share) in
+    # Supplier.reputation; 0.0 keeps reputation fixed
+    reputation_smoothing: float = 0.0
 
     # --- LEGACY FIELDS (Defaults to 0.0 to prevent errors) ---
     tau: float = 0.0
@@ -105,6 +122,26 @@ class ScenarioConfig:
     w_e: float = 0.0
     w_f: float = 0.0
 
+# =========================
+#  WEATHER
+# =========================
+
+def weather_from_uniform(u: float) -> float:
+    if u < DROUGHT_PROBABILITY:
+        return DROUGHT_SEVERITY  # DROUGHT! (80% loss for outdoor)
+    return 0.0  # Normal weather
+
+
+def weather_draws(T: int, seed: int) -> List[float]:
+    """
+    The T uniforms behind a run's weather, from a private RNG. Passing the same
+    draws to several scenarios gives common random numbers. Matches the
+    default stream of random.seed(seed).
+    """
+    rng = random.Random(seed)
+    return [rng.random() for _ in range(T)]
+
+
 # =========================
 #  ENVIRONMENTAL DATA MODULE
 # =========================
@@ -123,6 +160,65 @@ class EnvironmentalDataModule:
         return 0.0
 
 
+# =========================
+#  SPATIAL INDEX
+# =========================
+
+class SpatialIndex:
+    """
+    Uniform grid over supplier coordinates. Precomputes, for every buyer, the
+    suppliers within `radius` km so ranking and allocation only look at nearby
+    farms. Suppliers (or buyers) without coordinates are never pruned.
+    """
+
+    def __init__(self, suppliers: List[Supplier], buyers: List[Buyer],
+                 radius: float = SPOILAGE_CAP_DISTANCE, cell_size: Optional[float] = None):
+        self.radius = radius
+        self.cell_size = cell_size or radius
+        self.suppliers = list(suppliers)
+
+        self.grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.unlocated: List[int] = []
+        for i, s in enumerate(self.suppliers):
+            if s.x is None or s.y is None:
+                self.unlocated.append(i)
+            else:
+                self.grid[self._cell(s.x, s.y)].append(i)
+
+        self.candidates_by_buyer: Dict[str, List[Supplier]] = {
+            b.id: self._query(b) for b in buyers
+        }
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)))
+
+    def _query(self, buyer: Buyer) -> List[Supplier]:
+        if buyer.x is None or buyer.y is None:
+            return list(self.suppliers)
+
+        reach = int(math.ceil(self.radius / self.cell_size))
+        cx, cy = self._cell(buyer.x, buyer.y)
+        hits = list(self.unlocated)
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                for i in self.grid.get((gx, gy), ()):
+                    s = self.suppliers[i]
+                    dist = math.hypot(s.x - buyer.x, s.y - buyer.y)
+                    if dist <= self.radius:
+                        # Populations built from coordinates alone get their distances here
+                        s.distances.setdefault(buyer.id, dist)
+                        hits.append(i)
+
+        # Keep the original supplier order so ranking ties break as before
+        hits.sort()
+        return [self.suppliers[i] for i in hits]
+
+    def candidates(self, buyer: Buyer) -> List[Supplier]:
+        if buyer.id not in self.candidates_by_buyer:
+            self.candidates_by_buyer[buyer.id] = self._query(buyer)
+        return self.candidates_by_buyer[buyer.id]
+
+
 # =========================
 #  FAIRNESS MODULE
 # =========================
@@ -134,6 +230,16 @@ class FairnessModule:
         self.disp_cap = disp_cap
 
     def update_fairness(self, suppliers: List[Supplier], allocations: Dict[Tuple[str, str], float]) -> None:
+        self.accumulate(suppliers, allocations)
+
+        # Disparity. fsum is exactly rounded, so the totals do not depend on
+        # summation order (sharded runs rebuild them from per-region parts)
+        total_Q = math.fsum(s.Q for s in suppliers)
+        total_Cap = math.fsum(s.cap_nominal for s in suppliers)
+        self.apply_disparity(suppliers, total_Q, total_Cap)
+
+    def accumulate(self, suppliers: List[Supplier], allocations: Dict[Tuple[str, str], float]) -> None:
+        """Add this round's allocations to Q and update rotation fairness."""
         allocated_by_supplier = {s.id: 0.0 for s in suppliers}
         for (sid, _), q in allocations.items():
             allocated_by_supplier[sid] += q
@@ -149,10 +255,8 @@ class FairnessModule:
                 s.rot_wait += 1
             s.F_rot = 1.0 / (1.0 + s.rot_wait)
 
-        # Disparity
-        total_Q = sum(s.Q for s in suppliers)
-        total_Cap = sum(s.cap_nominal for s in suppliers)
-
+    def apply_disparity(self, suppliers: List[Supplier], total_Q: float, total_Cap: float) -> None:
+        """Disparity and unified fairness given market-wide totals (which may span other shards)."""
         if total_Q <= self.eps or total_Cap <= self.eps:
             for s in suppliers: s.F_disp = 1.0
         else:
@@ -166,6 +270,25 @@ class FairnessModule:
         for s in suppliers:
             s.F_unified = self.delta * s.F_rot + (1.0 - self.delta) * s.F_disp
 
+    def update_fairness_arrays(self, Q: np.ndarray, rot_wait: np.ndarray, cap_nominal: np.ndarray,
+                               allocated: np.ndarray) -> np.ndarray:
+        """
+        Vectorized update over (suppliers x crops) arrays. Q and rot_wait are
+        updated in place; disparity is measured per crop. Returns F_unified.
+        """
+        Q += allocated
+        rot_wait[:] = np.where(allocated > 0, 0, rot_wait + 1)
+        F_rot = 1.0 / (1.0 + rot_wait)
+
+        total_Q = Q.sum(axis=0)
+        total_Cap = cap_nominal.sum(axis=0)
+        H = Q / (total_Q + self.eps)
+        E = cap_nominal / (total_Cap + self.eps)
+        F_disp = np.clip(H / (E + self.eps), self.eps, self.disp_cap)
+        F_disp = np.where((total_Q <= self.eps) | (total_Cap <= self.eps), 1.0, F_disp)
+
+        return self.delta * F_rot + (1.0 - self.delta) * F_disp
+
 
 # =========================
 #  POLICY & SCORING MODULE
@@ -211,6 +334,24 @@ class PolicyScoringModule:
 
         return scores
 
+    def compute_score_matrix(self, price: np.ndarray, water: np.ndarray, energy: np.ndarray,
+                             reputation: np.ndarray, fairness: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+        """
+        Equations 1-2 over a (suppliers x crops) block in one pass. Cost is
+        normalised per crop against the most expensive eligible supplier;
+        ineligible cells score 0.
+        """
+        tax = water * self.scenario.scarcity_cost_water + energy * self.scenario.scarcity_cost_energy
+        total_c = price + tax
+        max_cost = np.max(np.where(eligible, total_c, -np.inf), axis=0)
+        max_cost = np.where(np.isfinite(max_cost), max_cost, 1.0)
+        norm_cost = np.maximum(1.0 - (total_c / (max_cost * 1.2)), 0.0)
+
+        S = (self.scenario.alpha * norm_cost) + \
+            (self.scenario.beta * reputation[:, None]) + \
+            (self.scenario.gamma * fairness)
+        return np.where(eligible, S, 0.0)
+
     def carbon_adjusted_cost(self, base_cost, co2):
         return base_cost
 
@@ -221,16 +362,20 @@ class PolicyScoringModule:
 # =========================
 
 class MarketplaceModule:
-    def __init__(self, env_module, fairness_module, policy_module):
+    def __init__(self, env_module, fairness_module, policy_module, spatial_index: Optional[SpatialIndex] = None):
         self.env = env_module
         self.fairness = fairness_module
         self.policy = policy_module
+        self.spatial_index = spatial_index
 
     def refresh_state(self, suppliers, buyers):
         for s in suppliers: s.reset_capacity()
         for b in buyers: b.reset_demand()
 
-    def filter_suppliers(self, suppliers):
+    def filter_suppliers(self, suppliers, buyer=None):
+        # With a spatial index only the buyer's nearby candidates are scanned
+        if self.spatial_index is not None and buyer is not None:
+            suppliers = self.spatial_index.candidates(buyer)
         return [s for s in suppliers if s.cap_available > 0]
 
     def rank_suppliers(self, suppliers, buyer):
@@ -249,9 +394,10 @@ class MarketplaceModule:
             buyer.demand_remaining -= q
         return allocations
 
-    def allocate_proportional(self, eligible_suppliers, buyer):
+    def allocate_proportional(self, eligible_suppliers, buyer, scores=None):
         allocations = {}
-        scores = self.policy.compute_scores(eligible_suppliers, buyer)
+        if scores is None:
+            scores = self.policy.compute_scores(eligible_suppliers, buyer)
         total_score = sum(scores.values())
         if total_score == 0: return allocations
 
@@ -264,6 +410,26 @@ class MarketplaceModule:
         buyer.demand_remaining = 0
         return allocations
 
+    def allocate_sequential_matrix(self, scores: np.ndarray, cap: np.ndarray, demand: np.ndarray) -> np.ndarray:
+        """
+        Greedy fill for every crop at once: suppliers sorted by descending score
+        (ties keep supplier order, like sorted()), each taking what is left of the
+        crop's demand up to its capacity. cap must be 0 for ineligible suppliers.
+        """
+        order = np.argsort(-scores, axis=0, kind="stable")
+        cap_sorted = np.take_along_axis(cap, order, axis=0)
+        before = np.cumsum(cap_sorted, axis=0) - cap_sorted
+        q_sorted = np.clip(demand[None, :] - before, 0.0, cap_sorted)
+        alloc = np.empty_like(q_sorted)
+        np.put_along_axis(alloc, order, q_sorted, axis=0)
+        return alloc
+
+    def allocate_proportional_matrix(self, scores: np.ndarray, cap: np.ndarray, demand: np.ndarray) -> np.ndarray:
+        """Score-proportional split of each crop's nominal demand, capped by capacity."""
+        total = scores.sum(axis=0)
+        share = np.divide(scores, total, out=np.zeros_like(scores), where=total > 0)
+        return np.minimum(share * demand[None, :], cap)
+
     def compute_emissions(self, suppliers, buyer, allocations):
         return {"CO2_prod": 0.0, "CO2_trans": 0.0, "CO2_total": 0.0}
 
@@ -276,6 +442,236 @@ class MarketplaceModule:
         return total
 
 
+# =========================
+#  DELIVERY MODULE
+# =========================
+
+# Rounds with fewer allocations than this are booked with a plain loop, which
+# adds up exactly the same sums in the same order as the bincount path
+DELIVERY_VECTOR_MIN = 64
+
+
+def _distance_source(suppliers: List[Supplier], buyer_ids: List[str]):
+    """
+    (D, d_rows, d_cols, extra): D[d_rows[i], d_cols[j]] is the stored km from
+    supplier i to buyer j (NaN or d_cols[j] < 0: none) and `extra` maps
+    (i, j) to distances held outside D (DistanceRow overlays). Population
+    suppliers share their mapped matrix, so nothing is copied; anything else
+    is packed once into a dense (S, B) matrix, overlays included, returned
+    with d_rows = d_cols = None.
+    """
+    matrices = [getattr(s.distances, "matrix", None) for s in suppliers]
+    extra: Dict[Tuple[int, int], float] = {}
+    b_pos = {b: j for j, b in enumerate(buyer_ids)}
+    for i, s in enumerate(suppliers):
+        for b, d in getattr(s.distances, "overlay", {}).items():
+            if b in b_pos:
+                extra[(i, b_pos[b])] = d
+
+    shared = matrices[0] if matrices else None
+    if shared is not None and all(m is shared for m in matrices) and \
+            all(s.distances.buyer_index is suppliers[0].distances.buyer_index for s in suppliers):
+        index = suppliers[0].distances.buyer_index
+        d_rows = np.array([s.distances.index for s in suppliers], dtype=np.intp)
+        d_cols = np.array([index.get(b, -1) for b in buyer_ids], dtype=np.intp)
+        return shared, d_rows, d_cols, extra
+
+    dtype = np.float64
+    if matrices and all(m is not None for m in matrices):
+        dtype = np.result_type(*{m.dtype for m in matrices})
+    D = np.full((len(suppliers), len(buyer_ids)), np.nan, dtype=dtype)
+    col_cache = {}
+    for i, s in enumerate(suppliers):
+        if matrices[i] is not None:
+            index = s.distances.buyer_index
+            if id(index) not in col_cache:
+                cols = np.array([index.get(b, -1) for b in buyer_ids], dtype=np.intp)
+                col_cache[id(index)] = (cols, np.flatnonzero(cols >= 0))
+            cols, known = col_cache[id(index)]
+            D[i, known] = s.distances.row[cols[known]]
+        else:
+            for b, d in s.distances.items():
+                if b in b_pos:
+                    D[i, b_pos[b]] = d
+    for (i, j), d in extra.items():
+        D[i, j] = d
+    return D, None, None, {}
+
+
+class DeliveryModule:
+    """
+    Spoilage, waste and reputation for a whole round of allocations at once.
+    Each round gathers the distances of just the allocated pairs from the
+    distance matrix with one fancy index; waste is summed per supplier and
+    per buyer with bincount and reputation moves towards the round's delivery
+    quality by an EWMA. Waste is written back onto the agents by sync().
+    """
+
+    def __init__(self, suppliers: List[Supplier], buyer_ids: List[str], smoothing: float = 0.0):
+        self.s_index = {s.id: i for i, s in enumerate(suppliers)}
+        self.b_index = {b: j for j, b in enumerate(buyer_ids)}
+        self.smoothing = smoothing
+        self.D, self.d_rows, self.d_cols, extra = _distance_source(suppliers, buyer_ids)
+        # A float64 matrix of our own is turned into rates once (a float32 one
+        # would round them); shared or float32 distances are converted per round
+        self.R = None
+        if self.d_rows is None and self.D.dtype == np.float64:
+            self.R = self._to_rates(self.D)
+            self.D = None
+        self.unknown_cols = self.d_cols is not None and bool((self.d_cols < 0).any())
+        B = len(buyer_ids)
+        self.extra = extra
+        self.extra_keys = np.array(sorted(i * B + j for i, j in extra), dtype=np.int64)
+        self.extra_km = np.array([extra[divmod(k, B)] for k in self.extra_keys.tolist()], dtype=float)
+        self.waste_by_supplier = np.array([s.waste_generated for s in suppliers], dtype=float)
+        self.waste_by_buyer = np.zeros(B)
+        self.reputation = np.array([s.reputation for s in suppliers], dtype=float)
+        self.delivered: List[int] = []  # supplier rows whose reputation the last round moved
+
+    @staticmethod
+    def _to_rates(d: np.ndarray) -> np.ndarray:
+        # In place on a float64 array; no known distance (NaN) means 0 km
+        d[np.isnan(d)] = 0.0
+        d /= 100.0
+        d *= SPOILAGE_PER_100KM
+        return np.minimum(d, SPOILAGE_CAP, out=d)
+
+    def rates(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Spoilage rate of each (supplier row, buyer column) pair."""
+        if self.R is not None:
+            return self.R[rows, cols]
+        if self.d_rows is None:
+            d = self.D[rows, cols].astype(float)
+        else:
+            d_cols = self.d_cols[cols]
+            d = self.D[self.d_rows[rows], d_cols].astype(float)
+            if self.unknown_cols:
+                d[d_cols < 0] = np.nan
+        if len(self.extra_keys):
+            flat = rows * len(self.b_index) + cols
+            pos = np.minimum(np.searchsorted(self.extra_keys, flat), len(self.extra_keys) - 1)
+            hit = self.extra_keys[pos] == flat
+            d[hit] = self.extra_km[pos[hit]]
+        return self._to_rates(d)
+
+    def rate(self, i: int, j: int) -> float:
+        """Spoilage rate of one pair, computed exactly as rates() does."""
+        if self.R is not None:
+            return self.R.item(i, j)
+        d = self.extra.get((i, j))
+        if d is None:
+            if self.d_rows is not None:
+                i, j = self.d_rows[i], self.d_cols[j]
+            d = self.D.item(i, j) if j >= 0 else 0.0
+            if d != d:
+                d = 0.0
+        return min((d / 100.0) * SPOILAGE_PER_100KM, SPOILAGE_CAP)
+
+    def deliver(self, allocations: Dict[Tuple[str, str], float]) -> List[float]:
+        """Book one round of allocations; returns the waste of each allocation, in dict order."""
+        n = len(allocations)
+        if n < DELIVERY_VECTOR_MIN:
+            return self._deliver_small(allocations)
+        keys = list(allocations)
+        rows = np.fromiter(map(self.s_index.__getitem__, map(itemgetter(0), keys)), dtype=np.intp, count=n)
+        cols = np.fromiter(map(self.b_index.__getitem__, map(itemgetter(1), keys)), dtype=np.intp, count=n)
+        q = np.fromiter(allocations.values(), dtype=float, count=n)
+
+        # Sum the round first, then add it to the totals: the same order
+        # whatever the round's size or however the allocations are split
+        waste = q * self.rates(rows, cols)
+        S = len(self.waste_by_supplier)
+        waste_s = np.bincount(rows, weights=waste, minlength=S)
+        self.waste_by_supplier += waste_s
+        self.waste_by_buyer += np.bincount(cols, weights=waste, minlength=len(self.waste_by_buyer))
+
+        if self.smoothing > 0:
+            q_s = np.bincount(rows, weights=q, minlength=S)
+            delivered = np.flatnonzero(q_s > 0)
+            quality = 1.0 - waste_s[delivered] / q_s[delivered]
+            self.reputation[delivered] += self.smoothing * (quality - self.reputation[delivered])
+            self.delivered = delivered.tolist()
+        return waste.tolist()
+
+    def _deliver_small(self, allocations: Dict[Tuple[str, str], float]) -> List[float]:
+        # Per-round totals start at 0.0 and take each allocation in dict
+        # order, as bincount does, and are then added to the running totals
+        waste, round_s, round_q, round_b = [], {}, {}, {}
+        s_index, b_index = self.s_index, self.b_index
+        rate = self.R.item if self.R is not None else self.rate
+        for (sid, bid), q in allocations.items():
+            i = s_index[sid]
+            j = b_index[bid]
+            w = q * rate(i, j)
+            waste.append(w)
+            round_s[i] = round_s.get(i, 0.0) + w
+            round_q[i] = round_q.get(i, 0.0) + q
+            round_b[j] = round_b.get(j, 0.0) + w
+        for i, w in round_s.items():
+            self.waste_by_supplier[i] += w
+        for j, w in round_b.items():
+            self.waste_by_buyer[j] += w
+
+        if self.smoothing > 0:
+            rep = self.reputation
+            self.delivered = [i for i, q in round_q.items() if q > 0]
+            for i in self.delivered:
+                quality = 1.0 - round_s[i] / round_q[i]
+                rep[i] += self.smoothing * (quality - rep[i])
+        return waste
+
+    def sync_reputation(self, suppliers: List[Supplier]) -> None:
+        # Scoring reads Supplier.reputation: copy over the values the last
+        # round changed (nothing unless smoothing is on)
+        if self.delivered:
+            for i, r in zip(self.delivered, self.reputation[self.delivered].tolist()):
+                suppliers[i].reputation = r
+
+    def sync(self, suppliers: List[Supplier], buyers: Optional[List[Buyer]] = None) -> None:
+        """Write waste and reputation back onto the agents, e.g. for extract_metrics."""
+        for s, w, r in zip(suppliers, self.waste_by_supplier.tolist(), self.reputation.tolist()):
+            s.waste_generated = w
+            s.reputation = r
+        for b in buyers or []:
+            b.waste_received = float(self.waste_by_buyer[self.b_index[b.id]])
+
+
+# =========================
+#  EVENT BUS
+# =========================
+
+# Per-round events emitted by Simulation.run and their keyword payloads:
+#   weather:    t, severity
+#   allocation: t, allocations
+#   fairness:   t, suppliers            (after the fairness update)
+#   emissions:  t, emissions
+#   cost:       t, cost
+#   round_end:  t, allocations, suppliers
+ROUND_EVENTS = ("weather", "allocation", "fairness", "emissions", "cost", "round_end")
+
+
+class EventBus:
+    """
+    Subscriber registry for per-round simulation events. Outputs that nobody
+    subscribed to (emissions, cost) are not computed at all.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List] = {name: [] for name in ROUND_EVENTS}
+
+    def subscribe(self, event: str, handler) -> None:
+        if event not in self.handlers:
+            raise ValueError(f"Unknown event '{event}'. Expected one of {ROUND_EVENTS}")
+        self.handlers[event].append(handler)
+
+    def wants(self, event: str) -> bool:
+        return bool(self.handlers[event])
+
+    def emit(self, event: str, **payload) -> None:
+        for handler in self.handlers[event]:
+            handler(**payload)
+
+
 # =========================
 #  LOGGER
 # =========================
@@ -287,6 +683,22 @@ class Logger:
         self.cost_total_per_t = []
         self.allocated_total_per_t = []
         self.fairness_snapshots = []
+        self._emissions = {}
+        self._cost = 0.0
+
+    def attach(self, events: EventBus) -> None:
+        events.subscribe("emissions", self._on_emissions)
+        events.subscribe("cost", self._on_cost)
+        events.subscribe("round_end", self._on_round_end)
+
+    def _on_emissions(self, t, emissions):
+        self._emissions = emissions
+
+    def _on_cost(self, t, cost):
+        self._cost = cost
+
+    def _on_round_end(self, t, allocations, suppliers):
+        self.record(t, allocations, suppliers, self._emissions, self._cost)
 
     def record(self, t, allocations, suppliers, emissions, cost_total):
         self.allocations_per_t.append(dict(allocations))
@@ -303,7 +715,9 @@ class Logger:
 # =========================
 
 class Simulation:
-    def __init__(self, suppliers, buyers, env_module, fairness_module, policy_module, marketplace, logger, scenario):
+    def __init__(self, suppliers, buyers, env_module, fairness_module, policy_module, marketplace, logger, scenario,
+                 profiler=None, events: Optional[EventBus] = None, weather: Optional[List[float]] = None,
+                 delivery: Optional[DeliveryModule] = None):
         self.suppliers = suppliers
         self.buyers = buyers
         self.env = env_module
@@ -312,51 +726,160 @@ class Simulation:
         self.marketplace = marketplace
         self.logger = logger
         self.scenario = scenario
+        self.profiler = profiler  # profiling.StageProfiler or None
+        # Optional pre-drawn weather uniforms (see weather_draws); otherwise
+        # each round draws from the global random module
+        self.weather = weather
+        self.delivery = delivery
+
+        # The logger is just one subscriber; pass logger=None with your own
+        # EventBus sinks for headless runs
+        self.events = events if events is not None else EventBus()
+        if logger is not None:
+            logger.attach(self.events)
 
     def run(self):
-        T = self.scenario.T
-        buyer = self.buyers[0]
-
-        # Weather Pattern: 10% chance of severe drought (severity=0.8)
-        # Otherwise normal fluctuation (severity=0.0 to 0.1)
+        # Two copies of the round loop over the same step methods: the plain one
+        # has no stage contexts at all, the profiled one wraps each step
+        if self.profiler is None:
+            self._run()
+        else:
+            with self.profiler.session():
+                self._run_profiled(self.profiler.stage)
 
+    def _start(self) -> int:
+        T = self.scenario.T
+        # Built here rather than in __init__ so distances filled in by a
+        # SpatialIndex are already in place
+        if self.delivery is None:
+            self.delivery = DeliveryModule(self.suppliers, [b.id for b in self.buyers],
+                                           smoothing=self.scenario.reputation_smoothing)
+        if self.weather is not None and len(self.weather) < T:
+            raise ValueError(f"Need {T} weather draws, got {len(self.weather)}")
+        events = self.events
+        self._want_weather = events.wants("weather")
+        self._want_allocation = events.wants("allocation")
+        self._want_fairness = events.wants("fairness")
+        self._want_emissions = events.wants("emissions")
+        self._want_cost = events.wants("cost")
+        self._want_round_end = events.wants("round_end")
+        return T
+
+    def _run(self):
+        T = self._start()
+        marketplace, policy = self.marketplace, self.policy
+        sequential = self.scenario.allocation_mode == "sequential"
         for t in range(1, T + 1):
-            # Generate Weather
-            roll = random.random()
-
-            if roll < 0.10:
-                weather_severity = 0.8  # DROUGHT! (80% loss for outdoor)
-            else:
-                weather_severity = 0.0  # Normal weather
-
-            # Refresh capacity with Weather Impact
-            for s in self.suppliers:
-                # FIX: Pass current time 't' and total time 'T' (as T_total)
-                s.reset_capacity(t, weather_severity, T)
-
-            buyer.reset_demand()
-
-            eligible = self.marketplace.filter_suppliers(self.suppliers)
-            if self.scenario.allocation_mode == "sequential":
-                ranked = self.marketplace.rank_suppliers(eligible, buyer)
-                allocations = self.marketplace.allocate_sequential(ranked, buyer)
-            else:
-                allocations = self.marketplace.allocate_proportional(eligible, buyer)
-
-            # FIX: Spoilage calculation must happen regardless of allocation mode
-            # We unindent this block so it runs for both Sequential AND Proportional
-            for (sid, bid), q in allocations.items():
-                s = next(s for s in self.suppliers if s.id == sid)
-                waste = s.calculate_spoilage(bid, q)
-                # Note: The buyer pays for 'q', but receives 'q - waste'
-            # -------------------------------
-
+            self._reset_capacity(t, self._weather_severity(t), T)
+
+            # Buyers clear one after another against their candidate suppliers
+            allocations = {}
+            for buyer in self.buyers:
+                buyer.reset_demand()
+                eligible = marketplace.filter_suppliers(self.suppliers, buyer)
+                if sequential:
+                    allocations.update(marketplace.allocate_sequential(marketplace.rank_suppliers(eligible, buyer),
+                                                                       buyer))
+                else:
+                    allocations.update(marketplace.allocate_proportional(eligible, buyer,
+                                                                         policy.compute_scores(eligible, buyer)))
+            if self._want_allocation:
+                self.events.emit("allocation", t=t, allocations=allocations)
+
+            self._deliver(allocations)
             if self.scenario.use_fairness:
-                self.fairness.update_fairness(self.suppliers, allocations)
-
-            emissions = self.marketplace.compute_emissions(self.suppliers, buyer, allocations)
-            cost = self.marketplace.compute_cost_total(self.suppliers, allocations)
-            self.logger.record(t, allocations, self.suppliers, emissions, cost)
+                self._update_fairness(t, allocations)
+            if self._want_emissions:
+                self._emit_emissions(t, allocations)
+            if self._want_cost:
+                self._emit_cost(t, allocations)
+            if self._want_round_end:
+                self._emit_round_end(t, allocations)
+
+        self.delivery.sync(self.suppliers, self.buyers)
+
+    def _run_profiled(self, stage):
+        # Same steps as _run, each inside a profiler stage
+        T = self._start()
+        marketplace, policy = self.marketplace, self.policy
+        sequential = self.scenario.allocation_mode == "sequential"
+        for t in range(1, T + 1):
+            severity = self._weather_severity(t)
+            with stage("capacity_reset"):
+                self._reset_capacity(t, severity, T)
+
+            allocations = {}
+            for buyer in self.buyers:
+                buyer.reset_demand()
+                with stage("filter"):
+                    eligible = marketplace.filter_suppliers(self.suppliers, buyer)
+                if sequential:
+                    with stage("rank"):
+                        ranked = marketplace.rank_suppliers(eligible, buyer)
+                    with stage("allocate"):
+                        allocations.update(marketplace.allocate_sequential(ranked, buyer))
+                else:
+                    with stage("rank"):
+                        scores = policy.compute_scores(eligible, buyer)
+                    with stage("allocate"):
+                        allocations.update(marketplace.allocate_proportional(eligible, buyer, scores))
+            if self._want_allocation:
+                self.events.emit("allocation", t=t, allocations=allocations)
+
+            with stage("spoilage"):
+                self._deliver(allocations)
+            if self.scenario.use_fairness:
+                with stage("fairness_update"):
+                    self._update_fairness(t, allocations)
+            if self._want_emissions:
+                with stage("emissions"):
+                    self._emit_emissions(t, allocations)
+            if self._want_cost:
+                with stage("cost"):
+                    self._emit_cost(t, allocations)
+            if self._want_round_end:
+                with stage("log"):
+                    self._emit_round_end(t, allocations)
+
+        self.delivery.sync(self.suppliers, self.buyers)
+
+    # ---- round steps ----
+
+    def _weather_severity(self, t: int) -> float:
+        # Weather Pattern: 10% chance of severe drought (severity=0.8)
+        # Otherwise normal fluctuation (severity=0.0 to 0.1)
+        roll = self.weather[t - 1] if self.weather is not None else random.random()
+        severity = weather_from_uniform(roll)
+        if self._want_weather:
+            self.events.emit("weather", t=t, severity=severity)
+        return severity
+
+    def _reset_capacity(self, t: int, severity: float, T: int) -> None:
+        # Refresh capacity with Weather Impact
+        for s in self.suppliers:
+            # FIX: Pass current time 't' and total time 'T' (as T_total)
+            s.reset_capacity(t, severity, T)
+
+    def _deliver(self, allocations) -> None:
+        # Spoilage for both allocation modes. The buyer pays for 'q', but receives 'q - waste'
+        self.delivery.deliver(allocations)
+        self.delivery.sync_reputation(self.suppliers)
+
+    def _update_fairness(self, t: int, allocations) -> None:
+        self.fairness.update_fairness(self.suppliers, allocations)
+        if self._want_fairness:
+            self.events.emit("fairness", t=t, suppliers=self.suppliers)
+
+    # Outputs below are only computed when a subscriber asked for them
+    def _emit_emissions(self, t: int, allocations) -> None:
+        emissions = self.marketplace.compute_emissions(self.suppliers, self.buyers[0], allocations)
+        self.events.emit("emissions", t=t, emissions=emissions)
+
+    def _emit_cost(self, t: int, allocations) -> None:
+        self.events.emit("cost", t=t, cost=self.marketplace.compute_cost_total(self.suppliers, allocations))
+
+    def _emit_round_end(self, t: int, allocations) -> None:
+        self.events.emit("round_end", t=t, allocations=allocations, suppliers=self.suppliers)
 
 # =========================
 #  FARMER GENERATION
@@ -0,0 +1,263 @@
+import argparse
+import dataclasses
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from global_sensitivity import DEFAULT_BOUNDS, SUMMARY_METRICS, evaluate
+from results_store import ResultsStore
+from scenarios import SCENARIOS
+from simulation import ScenarioConfig
+
+
+# =========================
+#  GAUSSIAN PROCESS
+# =========================
+
+class GaussianProcess:
+    """
+    Exact GP regression with an ARD squared-exponential kernel, in plain NumPy.
+    Inputs are expected in the unit cube and targets standardised; hyper-
+    parameters are picked by maximising the log marginal likelihood over a
+    small random search, which is plenty for a few thousand sweep points.
+    """
+
+    def __init__(self, n_restarts: int = 40, seed: int = 0):
+        self.n_restarts = n_restarts
+        self.seed = seed
+
+    @staticmethod
+    def _kernel(X1, X2, lengthscales, variance):
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab on scaled inputs: (n, m) memory, not (n, m, d)
+        A, B = X1 / lengthscales, X2 / lengthscales
+        sq = np.sum(A * A, axis=1)[:, None] + np.sum(B * B, axis=1)[None, :] - 2.0 * (A @ B.T)
+        return variance * np.exp(-0.5 * np.maximum(sq, 0.0))
+
+    def _nll(self, X, y, lengthscales, variance, noise):
+        K = self._kernel(X, X, lengthscales, variance) + noise * np.eye(len(X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return np.inf, None, None
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+        nll = 0.5 * y @ alpha + np.sum(np.log(np.diag(L)))
+        return nll, L, alpha
+
+    def fit(self, X: np.ndarray, y: np.ndarray, params: Optional[Dict[str, Any]] = None) -> "GaussianProcess":
+        self.X = X
+        self.y_mean, self.y_std = float(y.mean()), float(y.std()) or 1.0
+        yn = (y - self.y_mean) / self.y_std
+
+        if params is None:
+            rng = np.random.default_rng(self.seed)
+            d = X.shape[1]
+            candidates = [(np.full(d, 0.3), 1.0, 1e-2)]
+            for _ in range(self.n_restarts):
+                candidates.append((10 ** rng.uniform(-1.3, 0.7, d), 10 ** rng.uniform(-0.5, 0.5),
+                                   10 ** rng.uniform(-6, -0.5)))
+            best = min(candidates, key=lambda c: self._nll(X, yn, *c)[0])
+            params = {"lengthscales": best[0], "variance": best[1], "noise": best[2]}
+
+        self.params = params
+        _, self.L, self.alpha = self._nll(X, yn, params["lengthscales"], params["variance"], params["noise"])
+        if self.L is None:
+            raise np.linalg.LinAlgError("Kernel matrix is not positive definite")
+        # Inverse Cholesky factor up front so predictions are a couple of mat-vecs
+        self.L_inv = np.linalg.inv(self.L)
+        return self
+
+    def predict(self, Xq: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        p = self.params
+        Ks = self._kernel(Xq, self.X, p["lengthscales"], p["variance"])
+        mean = Ks @ self.alpha
+        v = self.L_inv @ Ks.T
+        var = np.maximum(p["variance"] - np.sum(v * v, axis=0), 1e-12)
+        return self.y_mean + self.y_std * mean, self.y_std * np.sqrt(var)
+
+
+# =========================
+#  SURROGATE
+# =========================
+
+def load_training_data(store_path: str, inputs: List[str], metrics: List[str],
+                       experiment: Optional[str] = None,
+                       base: Optional[ScenarioConfig] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (X, Y) from a ResultsStore: config fields in `inputs` -> summary metrics.
+    With `base`, only runs whose config equals it on every other field (apart
+    from the name) are used, so e.g. sequential S1 runs do not end up in a
+    surrogate of proportional S3 sweeps.
+    """
+    with ResultsStore(store_path) as store:
+        rows = store.query_summaries(metrics, experiment=experiment)
+        configs = store.query_configs({r["param_hash"] for r in rows})
+    rows = [r for r in rows if all(m in r for m in metrics)]
+    if base is not None:
+        fixed = {k: v for k, v in dataclasses.asdict(base).items() if k not in inputs and k != "name"}
+        rows = [r for r in rows
+                if all(getattr(configs[r["param_hash"]], k) == v for k, v in fixed.items())]
+    X = np.array([[getattr(configs[r["param_hash"]], f) for f in inputs] for r in rows], dtype=float)
+    Y = np.array([[r[m] for m in metrics] for r in rows], dtype=float)
+    return X, Y
+
+
+class Surrogate:
+    """
+    One GP per summary metric, mapping ScenarioConfig fields to extract_metrics
+    outputs. Fields not in `inputs` take their value from the base scenario.
+    """
+
+    def __init__(self, bounds: Dict[str, Tuple[float, float]] = DEFAULT_BOUNDS,
+                 metrics: List[str] = ("share_gini", "cost_mean", "total_waste"), base_key: str = "S3"):
+        self.bounds = dict(bounds)
+        self.inputs = list(bounds)
+        self.metrics = list(metrics)
+        self.base_key = base_key
+        self.lo = np.array([b[0] for b in self.bounds.values()])
+        self.hi = np.array([b[1] for b in self.bounds.values()])
+        self.models: Dict[str, GaussianProcess] = {}
+
+    def _unit(self, X: np.ndarray) -> np.ndarray:
+        return (X - self.lo) / (self.hi - self.lo)
+
+    def fit(self, X: np.ndarray, Y: np.ndarray) -> "Surrogate":
+        # Duplicate configs (several seeds) are averaged; the GP noise term covers the rest
+        X, inverse = np.unique(X, axis=0, return_inverse=True)
+        Y = np.stack([Y[inverse.ravel() == i].mean(axis=0) for i in range(len(X))])
+        self.X, self.Y = X, Y
+        self.models = {m: GaussianProcess().fit(self._unit(X), Y[:, j]) for j, m in enumerate(self.metrics)}
+        return self
+
+    def predict(self, X: np.ndarray) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        U = self._unit(np.atleast_2d(X))
+        return {m: gp.predict(U) for m, gp in self.models.items()}
+
+    def query(self, **params: float) -> Dict[str, Dict[str, float]]:
+        """e.g. query(gamma=0.37, scarcity_cost_water=0.08) -> {metric: {mean, std}}"""
+        base = SCENARIOS[self.base_key]
+        unknown = set(params) - set(self.inputs)
+        if unknown:
+            raise ValueError(f"Surrogate was not trained on {sorted(unknown)}; inputs are {self.inputs}")
+        x = np.array([[params.get(f, getattr(base, f)) for f in self.inputs]], dtype=float)
+        return {m: {"mean": float(mu[0]), "std": float(sd[0])} for m, (mu, sd) in self.predict(x).items()}
+
+    def cross_validate(self, k: int = 5, seed: int = 0) -> Dict[str, Dict[str, float]]:
+        """k-fold RMSE and R^2 per metric, reusing each metric's fitted hyperparameters."""
+        rng = np.random.default_rng(seed)
+        folds = np.array_split(rng.permutation(len(self.X)), k)
+        U = self._unit(self.X)
+        report = {}
+        for j, m in enumerate(self.metrics):
+            y = self.Y[:, j]
+            pred = np.empty_like(y)
+            for fold in folds:
+                train = np.setdiff1d(np.arange(len(y)), fold)
+                gp = GaussianProcess().fit(U[train], y[train], params=self.models[m].params)
+                pred[fold] = gp.predict(U[fold])[0]
+            rmse = float(np.sqrt(np.mean((pred - y) ** 2)))
+            ss_tot = float(np.sum((y - y.mean()) ** 2))
+            report[m] = {"rmse": rmse, "r2": 1.0 - float(np.sum((pred - y) ** 2)) / ss_tot if ss_tot > 0 else 1.0}
+        return report
+
+    def suggest(self, n: int = 8, n_candidates: int = 4096, seed: int = 0) -> np.ndarray:
+        """
+        Next simulation points where the surrogate is least certain (sum of
+        standardised predictive std over metrics). Points are picked one at a
+        time, pretending each pick was observed at its predicted mean
+        ("kriging believer") so the batch spreads out.
+        """
+        rng = np.random.default_rng(seed)
+        cand = rng.random((n_candidates, len(self.inputs)))
+        U, Y = self._unit(self.X), self.Y.copy()
+        models = dict(self.models)
+        picks = []
+        for _ in range(n):
+            score = np.zeros(n_candidates)
+            for j, m in enumerate(self.metrics):
+                mu, sd = models[m].predict(cand)
+                score += sd / (models[m].y_std or 1.0)
+            best = int(np.argmax(score))
+            picks.append(cand[best])
+            U = np.vstack([U, cand[best]])
+            Y = np.vstack([Y, [models[m].predict(cand[best:best + 1])[0][0] for m in self.metrics]])
+            models = {m: GaussianProcess().fit(U, Y[:, j], params=models[m].params) for j, m in enumerate(self.metrics)}
+            cand = np.delete(cand, best, axis=0)
+            n_candidates -= 1
+        return self.lo + np.array(picks) * (self.hi - self.lo)
+
+    # ---- persistence ----
+
+    def save(self, path: str) -> None:
+        meta = {"bounds": self.bounds, "metrics": self.metrics, "base_key": self.base_key,
+                "params": {m: {"lengthscales": gp.params["lengthscales"].tolist(),
+                               "variance": float(gp.params["variance"]), "noise": float(gp.params["noise"])}
+                           for m, gp in self.models.items()}}
+        np.savez(path, X=self.X, Y=self.Y, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path: str) -> "Surrogate":
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        sur = cls({k: tuple(v) for k, v in meta["bounds"].items()}, meta["metrics"], meta["base_key"])
+        sur.X, sur.Y = data["X"], data["Y"]
+        U = sur._unit(sur.X)
+        for j, m in enumerate(sur.metrics):
+            p = meta["params"][m]
+            params = {"lengthscales": np.array(p["lengthscales"]), "variance": p["variance"], "noise": p["noise"]}
+            sur.models[m] = GaussianProcess().fit(U, sur.Y[:, j], params=params)
+        return sur
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GP surrogate over stored sweep results")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_train = sub.add_parser("train", help="Fit on a ResultsStore and report validation error")
+    p_train.add_argument("--store", default="results.db")
+    p_train.add_argument("--experiment", default=None)
+    p_train.add_argument("--metrics", nargs="+", default=["share_gini", "cost_mean", "total_waste"],
+                         choices=SUMMARY_METRICS)
+    p_train.add_argument("--model", default="surrogate.npz")
+
+    p_query = sub.add_parser("query", help="Predict metrics, e.g. gamma=0.37 scarcity_cost_water=0.08")
+    p_query.add_argument("params", nargs="*", metavar="FIELD=VALUE")
+    p_query.add_argument("--model", default="surrogate.npz")
+
+    p_suggest = sub.add_parser("suggest", help="Pick the most uncertain points to simulate next")
+    p_suggest.add_argument("-n", type=int, default=8)
+    p_suggest.add_argument("--model", default="surrogate.npz")
+    p_suggest.add_argument("--run", metavar="DB", default=None,
+                           help="Simulate the suggestions and insert them into this ResultsStore")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        sur = Surrogate(metrics=args.metrics)
+        X, Y = load_training_data(args.store, sur.inputs, sur.metrics, experiment=args.experiment,
+                                  base=SCENARIOS[sur.base_key])
+        if len(X) < 5:
+            raise SystemExit(f"Only {len(X)} stored runs; run a sweep with --store first")
+        sur.fit(X, Y).save(args.model)
+        print(f"Trained on {len(sur.X)} distinct configs ({len(X)} runs), saved {args.model}")
+        for m, v in sur.cross_validate().items():
+            print(f"  {m:<14} CV RMSE={v['rmse']:.4g}  R^2={v['r2']:.3f}")
+
+    elif args.command == "query":
+        sur = Surrogate.load(args.model)
+        params = {k: float(v) for k, v in (p.split("=") for p in args.params)}
+        t0 = time.perf_counter()
+        answer = sur.query(**params)
+        ms = 1e3 * (time.perf_counter() - t0)
+        for m, v in answer.items():
+            print(f"{m:<14} {v['mean']:.4f} +/- {v['std']:.4f}")
+        print(f"({ms:.2f} ms)")
+
+    else:
+        sur = Surrogate.load(args.model)
+        X = sur.suggest(args.n)
+        for row in X:
+            print("  ".join(f"{f}={v:.4f}" for f, v in zip(sur.inputs, row)))
+        if args.run:
+            evaluate(X, sur.inputs, SCENARIOS[sur.base_key], store_path=args.run)
+            print(f"Simulated {len(X)} points into {args.run}; re-run `train` to refit")
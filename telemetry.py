@@ -0,0 +1,305 @@
+import argparse
+import atexit
+import json
+import multiprocessing.util
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+# Sink spec shared with child processes (ProcessPoolExecutor workers,
+# workqueue workers started from the same shell)
+ENV_VAR = "SIM_TELEMETRY"
+
+# Summary metrics averaged over the last `window` finished runs
+ROLLING_METRICS = ("share_gini", "cost_mean", "total_waste")
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+# =========================
+#  SINKS
+# =========================
+#
+# "unix:/path.sock" sends each record as one datagram to a viewer bound at that
+# path (dropped if nobody is listening); anything else is a JSON-lines file
+# opened for append, which several processes can share.
+
+class _FileSink:
+    def __init__(self, path: str):
+        self.f = open(path, "a", buffering=1)
+
+    def send(self, line: str) -> None:
+        self.f.write(line + "\n")
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class _SocketSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def send(self, line: str) -> None:
+        try:
+            self.sock.sendto(line.encode("utf-8"), self.path)
+        except OSError:
+            pass  # no viewer (yet); telemetry must never stop a run
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+def _open_sink(spec: str):
+    if spec.startswith("unix:"):
+        return _SocketSink(spec[len("unix:"):])
+    return _FileSink(spec)
+
+
+# =========================
+#  TELEMETRY
+# =========================
+
+class Telemetry:
+    """
+    Progress counters for one process, flushed to a sink at most once per
+    `interval` seconds. The per-round hook is a counter increment; the clock
+    is read only every `_stride` rounds (sized for ~20 reads per interval),
+    and everything else (rates, ETA, memory, rolling means) is computed only
+    when a record is actually written.
+    """
+
+    def __init__(self, sink: str, interval: float = 1.0, window: int = 50, source: Optional[str] = None):
+        self.sink = _open_sink(sink)
+        self.interval = interval
+        self.source = source or f"{socket.gethostname()}:{os.getpid()}"
+        self.rounds = 0
+        self.runs_done = 0
+        self.runs_total: Optional[int] = None
+        self.recent = deque(maxlen=window)
+        self.t_start = time.monotonic()
+        self._last = (self.t_start, 0, 0)  # time, rounds, runs at the last flush
+        self._next = self.t_start + interval
+        self._stride = self._countdown = 1
+        self.closed = False
+
+    # ---- hooks ----
+
+    def attach(self, events) -> None:
+        # "weather" is the cheapest per-round event to subscribe to
+        events.subscribe("weather", self._on_round)
+
+    def _on_round(self, t, severity):
+        self.rounds += 1
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self._stride
+            if time.monotonic() >= self._next:
+                self.flush()
+
+    def add_rounds(self, n: int) -> None:
+        """Count a finished run's rounds in one go instead of via attach()."""
+        self.rounds += n
+        if time.monotonic() >= self._next:
+            self.flush()
+
+    def plan(self, runs: int) -> None:
+        """Add `runs` to the expected total (for the ETA)."""
+        self.runs_total = (self.runs_total or 0) + runs
+
+    def run_done(self, metrics: Optional[Dict[str, Any]] = None, n: int = 1) -> None:
+        self.runs_done += n
+        if metrics is not None:
+            self.recent.append(metrics["summary"])
+        if time.monotonic() >= self._next:
+            self.flush()
+
+    # ---- output ----
+
+    def record(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        t0, rounds0, runs0 = self._last
+        dt = max(now - t0, 1e-9)
+        elapsed = now - self.t_start
+        rec = {
+            "ts": time.time(),
+            "source": self.source,
+            "elapsed_s": elapsed,
+            "rounds": self.rounds,
+            "rounds_per_sec": (self.rounds - rounds0) / dt,
+            "runs_done": self.runs_done,
+            "runs_per_sec": (self.runs_done - runs0) / dt,
+            "rss_mb": _rss_mb(),
+        }
+        if self.runs_total is not None:
+            rec["runs_total"] = self.runs_total
+            # Average rate since start: steadier than the last interval's
+            rate = self.runs_done / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.runs_total - self.runs_done, 0)
+            rec["eta_s"] = remaining / rate if rate > 0 else None
+        if self.recent:
+            rec["rolling"] = {m: sum(s[m] for s in self.recent) / len(self.recent)
+                              for m in ROLLING_METRICS if m in self.recent[-1]}
+        self._last = (now, self.rounds, self.runs_done)
+        self._stride = max(1, int((self.rounds - rounds0) / dt * self.interval / 20))
+        return rec
+
+    def flush(self, **extra) -> None:
+        if self.closed:
+            return
+        rec = self.record()
+        rec.update(extra)
+        self.sink.send(json.dumps(rec))
+        self._next = time.monotonic() + self.interval
+
+    def close(self) -> None:
+        if not self.closed:
+            self.flush(final=True)
+            self.closed = True
+            self.sink.close()
+
+
+_current: Dict[int, Telemetry] = {}
+
+
+def configure(sink: Optional[str], interval: float = 1.0) -> Optional[Telemetry]:
+    """Turn telemetry on for this process and any worker processes it starts."""
+    if not sink:
+        return None
+    os.environ[ENV_VAR] = f"{interval}|{sink}"
+    return current()
+
+
+def current() -> Optional[Telemetry]:
+    """This process's Telemetry, created on first use from the environment."""
+    spec = os.environ.get(ENV_VAR)
+    if not spec:
+        return None
+    pid = os.getpid()
+    if pid not in _current:
+        interval, _, sink = spec.partition("|")
+        _current[pid] = tel = Telemetry(sink, interval=float(interval))
+        atexit.register(tel.close)
+        # multiprocessing children (ProcessPoolExecutor workers) leave through
+        # os._exit, which skips atexit; its own exit hooks still run, so the
+        # last partial interval is not lost
+        multiprocessing.util.Finalize(None, tel.close, exitpriority=0)
+    return _current[pid]
+
+
+def add_telemetry_argument(parser) -> None:
+    parser.add_argument("--telemetry", metavar="SINK", default=None,
+                        help="Stream progress as JSON lines to a file or unix:/path.sock "
+                             "(watch with `python telemetry.py view SINK`)")
+
+
+# =========================
+#  VIEWER
+# =========================
+
+def _follow(sink: str, from_start: bool):
+    if sink.startswith("unix:"):
+        path = sink[len("unix:"):]
+        if os.path.exists(path):
+            os.remove(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        try:
+            while True:
+                yield sock.recv(65536).decode("utf-8")
+        finally:
+            sock.close()
+            os.remove(path)
+    else:
+        while not os.path.exists(sink):
+            time.sleep(0.5)
+        with open(sink) as f:
+            if not from_start:
+                f.seek(0, os.SEEK_END)
+            while True:
+                line = f.readline()
+                if line.endswith("\n"):
+                    yield line
+                else:
+                    time.sleep(0.25)
+
+
+def _fmt_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}h{m:02d}m" if h else f"{m}m{s:02d}s"
+
+
+def _status(latest: Dict[str, Dict[str, Any]], rec: Dict[str, Any], stale: float) -> str:
+    live = [r for r in latest.values() if rec["ts"] - r["ts"] <= stale and not r.get("final")]
+    parts = [f"{time.strftime('%H:%M:%S', time.localtime(rec['ts']))}"]
+    if live:
+        rate = sum(r["rounds_per_sec"] for r in live)
+        rss = sum(r["rss_mb"] or 0.0 for r in live)
+        parts += [f"{len(live)} proc", f"{rate:,.0f} rounds/s", f"rss {rss:,.0f} MB"]
+    else:
+        # Every source has finished or gone quiet: totals over the whole stream
+        # instead of an all-zero live rate
+        done = list(latest.values())
+        rounds = sum(r["rounds"] for r in done)
+        span = max(r["ts"] for r in done) - min(r["ts"] - r["elapsed_s"] for r in done)
+        rate = rounds / span if span > 0 else 0.0
+        peak = max((r["rss_mb"] or 0.0 for r in done), default=0.0)
+        parts += [f"done: {len(done)} proc", f"{rounds:,} rounds", f"{rate:,.0f} rounds/s avg",
+                  f"max rss {peak:,.0f} MB"]
+    planner = max((r for r in latest.values() if "runs_total" in r), key=lambda r: r["ts"], default=None)
+    if planner is not None:
+        parts.append(f"runs {planner['runs_done']}/{planner['runs_total']}")
+        parts.append(f"ETA {_fmt_eta(planner.get('eta_s'))}")
+        rolling = planner.get("rolling", {})
+    else:
+        parts.append(f"runs {sum(r['runs_done'] for r in latest.values())}")
+        rolling = rec.get("rolling", {})
+    parts += [f"{m} {v:.4g}" for m, v in rolling.items()]
+    return " | ".join(parts)
+
+
+def view(sink: str, from_start: bool = False, stale: float = 5.0) -> None:
+    """Print one status line per record, combining all sources seen recently."""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for line in _follow(sink, from_start):
+        rec = json.loads(line)
+        latest[rec["source"]] = rec
+        print(_status(latest, rec, stale), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail a telemetry stream")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_view = sub.add_parser("view", help="Follow a telemetry file or listen on unix:/path.sock")
+    p_view.add_argument("sink")
+    p_view.add_argument("--from-start", action="store_true", help="Replay a file from the beginning")
+    args = parser.parse_args()
+
+    # Exit through the normal path on kill/timeout so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        view(args.sink, from_start=args.from_start)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,28 @@
+import pytest
+
+from commodities import Crop, parse_crop
+from run_experiments import run_one
+
+
+@pytest.mark.parametrize("key", ["S1", "S2", "S3"])
+def test_single_crop_matches_agent_run(key):
+    agents = run_one(key, seed=3)
+    crops = run_one(key, seed=3, crops=["default"])
+    assert crops["summary"] == agents["summary"]
+    assert crops["groups"] == agents["groups"]
+    assert crops["timeseries"]["supply"] == pytest.approx(agents["timeseries"]["supply"], rel=1e-12)
+
+
+def test_multi_crop_run():
+    out = run_one("S3", seed=3, crops=["grain:0.5:0.5:0.8", "berries:2.0:1.5:0.2"])
+    assert set(out["crops"]) == {"grain", "berries"}
+    total = sum(c["total_allocated"] for c in out["crops"].values())
+    assert total == pytest.approx(out["summary"]["total_allocated"])
+    assert out["crops"]["berries"]["total_waste"] > out["crops"]["grain"]["total_waste"]
+
+
+def test_parse_crop():
+    assert parse_crop("default") == Crop("default")
+    assert parse_crop("kale:1.5").spoilage_factor == 1.5
+    with pytest.raises(ValueError):
+        parse_crop("kale:x")
@@ -0,0 +1,94 @@
+import pickle
+import random
+
+import pytest
+
+import simulation
+from simulation import Supplier, Buyer, DeliveryModule, SPOILAGE_PER_100KM, SPOILAGE_CAP
+from population import save_population, load_population
+
+
+def make_agents(n_suppliers=30, n_buyers=8, seed=0):
+    rng = random.Random(seed)
+    buyers = [Buyer(id=f"B{j}", demand_nominal=100.0) for j in range(n_buyers)]
+    suppliers = []
+    for i in range(n_suppliers):
+        # Whole km are exact in float32 too, so bundles and dicts agree; some pairs have no route
+        distances = {b.id: float(rng.randrange(0, 1500)) for b in buyers if rng.random() < 0.8}
+        suppliers.append(Supplier(id=f"Indoor_{i}", c=1.0, water_footprint=1.0, energy_footprint=1.0,
+                                  cap_nominal=50.0, distances=distances, reputation=rng.uniform(0.5, 1.0)))
+    return suppliers, buyers
+
+
+def make_rounds(suppliers, buyers, n_rounds=6, per_round=150, seed=1):
+    rng = random.Random(seed)
+    return [{(rng.choice(suppliers).id, rng.choice(buyers).id): rng.uniform(0.0, 20.0) for _ in range(per_round)}
+            for _ in range(n_rounds)]
+
+
+def book(suppliers, buyer_ids, rounds, smoothing=0.3):
+    d = DeliveryModule(suppliers, buyer_ids, smoothing=smoothing)
+    for allocations in rounds:
+        d.deliver(allocations)
+    return d.waste_by_supplier.tolist(), d.waste_by_buyer.tolist(), d.reputation.tolist()
+
+
+def reference(suppliers, buyer_ids, rounds, smoothing=0.3):
+    # Round totals per supplier/buyer in allocation order, then added to the running totals
+    s_index = {s.id: i for i, s in enumerate(suppliers)}
+    b_index = {b: j for j, b in enumerate(buyer_ids)}
+    waste_s = [s.waste_generated for s in suppliers]
+    waste_b = [0.0] * len(buyer_ids)
+    rep = [s.reputation for s in suppliers]
+    for allocations in rounds:
+        rs, rq, rb = {}, {}, {}
+        for (sid, bid), q in allocations.items():
+            i, j = s_index[sid], b_index[bid]
+            dist = suppliers[i].distances.get(bid, 0.0)
+            w = q * min((dist / 100.0) * SPOILAGE_PER_100KM, SPOILAGE_CAP)
+            rs[i] = rs.get(i, 0.0) + w
+            rq[i] = rq.get(i, 0.0) + q
+            rb[j] = rb.get(j, 0.0) + w
+        for i, w in rs.items():
+            waste_s[i] += w
+            if rq[i] > 0:
+                rep[i] += smoothing * ((1.0 - w / rq[i]) - rep[i])
+        for j, w in rb.items():
+            waste_b[j] += w
+    return waste_s, waste_b, rep
+
+
+@pytest.mark.parametrize("vector_min", [1, 10 ** 9])
+def test_matches_reference_on_both_paths(monkeypatch, vector_min):
+    suppliers, buyers = make_agents()
+    buyer_ids = [b.id for b in buyers]
+    rounds = make_rounds(suppliers, buyers)
+    monkeypatch.setattr(simulation, "DELIVERY_VECTOR_MIN", vector_min)
+    assert book(suppliers, buyer_ids, rounds) == reference(suppliers, buyer_ids, rounds)
+
+
+def test_round_size_does_not_change_results(monkeypatch):
+    suppliers, buyers = make_agents()
+    buyer_ids = [b.id for b in buyers]
+    rounds = make_rounds(suppliers, buyers, per_round=40)
+    results = []
+    for vector_min in (1, 10 ** 9):
+        monkeypatch.setattr(simulation, "DELIVERY_VECTOR_MIN", vector_min)
+        results.append(book(suppliers, buyer_ids, rounds))
+    assert results[0] == results[1]
+
+
+def test_bundle_rows_match_dict_distances(tmp_path):
+    suppliers, buyers = make_agents()
+    save_population(str(tmp_path / "pop"), suppliers, buyers)
+    bundled = load_population(str(tmp_path / "pop")).suppliers()
+    # Overlays (e.g. SpatialIndex fills) win over the mapped row, and cover buyers outside the bundle
+    for s in (suppliers[0], bundled[0]):
+        s.distances["B1"] = 333.0
+        s.distances["B_new"] = 50.0
+    buyer_ids = [b.id for b in buyers] + ["B_new"]
+    rounds = make_rounds(suppliers, buyers + [Buyer(id="B_new", demand_nominal=1.0)])
+    expected = book(suppliers, buyer_ids, rounds)
+    assert book(bundled, buyer_ids, rounds) == expected
+    # Pickled rows (as sent to shard processes) no longer share the mapped matrix
+    assert book(pickle.loads(pickle.dumps(bundled)), buyer_ids, rounds) == expected
@@ -0,0 +1,16 @@
+import pytest
+
+from ensemble import t_quantile
+
+# Two-sided 95% and 99% critical values from standard t tables
+TABLE = [
+    (0.975, 1, 12.706), (0.975, 2, 4.303), (0.975, 3, 3.182), (0.975, 5, 2.571),
+    (0.975, 10, 2.228), (0.975, 30, 2.042), (0.975, 60, 2.000), (0.975, 120, 1.980),
+    (0.995, 3, 5.841), (0.995, 10, 3.169), (0.995, 120, 2.617),
+]
+
+
+@pytest.mark.parametrize("p,df,expected", TABLE)
+def test_t_quantile_matches_tables(p, df, expected):
+    assert t_quantile(p, df) == pytest.approx(expected, abs=2e-3)
+    assert t_quantile(1.0 - p, df) == pytest.approx(-expected, abs=2e-3)
@@ -0,0 +1,34 @@
+import pytest
+
+from population import import_csv, load_population
+
+SUPPLIERS = "id,c,water_footprint,energy_footprint,cap_nominal\nA,1,2,3,10\n\nB,1,2,3,20\n"
+BUYERS = "id,demand_nominal\nX,5\n"
+
+
+def write(tmp_path, name, text):
+    p = tmp_path / name
+    p.write_text(text)
+    return str(p)
+
+
+def test_import_skips_blank_lines(tmp_path):
+    out = str(tmp_path / "pop")
+    import_csv(out, write(tmp_path, "s.csv", SUPPLIERS), write(tmp_path, "b.csv", BUYERS),
+               write(tmp_path, "d.csv", "supplier_id,buyer_id,distance\nB,X,40\n"))
+    pop = load_population(out)
+    suppliers = pop.suppliers()
+    assert [s.id for s in suppliers] == ["A", "B"]
+    assert suppliers[1].distances["X"] == 40
+
+
+@pytest.mark.parametrize("name,text,message", [
+    ("s.csv", SUPPLIERS + "C,1,2,3\n", "s.csv, line 5: expected 5 columns, got 4"),
+    ("b.csv", BUYERS + "Y,5,1\n", "b.csv, line 3: expected 2 columns, got 3"),
+    ("d.csv", "supplier_id,buyer_id,distance\nA,X\n", "d.csv, line 2: expected 3 columns, got 2"),
+])
+def test_malformed_row_reports_line(tmp_path, name, text, message):
+    files = {"s.csv": SUPPLIERS, "b.csv": BUYERS, "d.csv": "supplier_id,buyer_id,distance\n", name: text}
+    paths = {k: write(tmp_path, k, v) for k, v in files.items()}
+    with pytest.raises(ValueError, match=message):
+        import_csv(str(tmp_path / "pop"), paths["s.csv"], paths["b.csv"], paths["d.csv"])
@@ -0,0 +1,35 @@
+import sqlite3
+
+import results_store
+from results_store import ResultsStore
+from scenarios import SCENARIOS
+
+N = 3000
+
+
+def metrics(key, seed):
+    return {"scenario_key": key, "summary": {"total_allocated": float(seed), "share_gini": 0.5},
+            "groups": {"Indoor": 0.25}, "timeseries": {"supply": [1.0, float(seed)]}}
+
+
+def test_long_filters(tmp_path, monkeypatch):
+    with ResultsStore(str(tmp_path / "r.db")) as store:
+        # Builds differ (32766 by default since 3.32, some distros raise it); use the old 999
+        store.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        store.insert_runs((SCENARIOS["S1"], seed, metrics("S1", seed)) for seed in range(N))
+        seeds = [s for s in range(N) if s % 7] + [N + 1]  # duplicates and misses are fine
+        runs = store.query_runs(seeds=seeds + seeds[:10])
+        assert [r["seed"] for r in runs] == seeds[:-1]
+
+        summaries = store.query_summaries(metrics=["total_allocated"], seeds=seeds)
+        assert [s["total_allocated"] for s in summaries] == [float(s) for s in seeds[:-1]]
+        ts = store.query_timeseries("supply", [r["run_id"] for r in runs])
+        assert all(v == [1.0, float(r["seed"])] for r, v in zip(runs, ts.values()))
+
+        # The inline IN (?, ...) path and the temp table path agree
+        few = seeds[:300]
+        inline = store.query_summaries(seeds=few), store.query_configs([runs[0]["param_hash"]]), store.load_results(seed=7)
+        monkeypatch.setattr(results_store, "MAX_INLINE_PARAMS", 0)
+        assert (store.query_summaries(seeds=few), store.query_configs([runs[0]["param_hash"]]), store.load_results(seed=7)) == inline
+        assert store.query_runs(seeds=few) == runs[:300]
+        assert inline[2]["S1"]["summary"]["total_allocated"] == 7.0
@@ -0,0 +1,93 @@
+import dataclasses
+import random
+
+import pytest
+
+from simulation import (
+    Supplier,
+    Buyer,
+    EnvironmentalDataModule,
+    FairnessModule,
+    PolicyScoringModule,
+    MarketplaceModule,
+    SpatialIndex,
+    EventBus,
+    Simulation,
+    weather_draws,
+)
+from sharding import ShardedSimulation
+from extract_metrics import extract_metrics, RunAccumulator
+from scenarios import SCENARIOS
+
+RADIUS = 600.0
+
+
+def make_population(seed=1, n_suppliers=300, n_buyers=40, size=4000.0, buyer_regions=True):
+    # Four regions on a 2 x 2 grid; the radius puts some buyers across region borders
+    rng = random.Random(seed)
+    half = size / 2
+    suppliers = []
+    for i in range(n_suppliers):
+        x, y = rng.uniform(0, size), rng.uniform(0, size)
+        kind = "Indoor" if rng.random() < 0.4 else "Outdoor"
+        suppliers.append(Supplier(id=f"{kind}_{i}", c=rng.uniform(1, 3), water_footprint=rng.uniform(10, 100),
+                                  energy_footprint=rng.uniform(1, 5), cap_nominal=rng.uniform(20, 100),
+                                  distances={}, reputation=rng.uniform(0.7, 1.0),
+                                  weather_susceptibility=0.0 if kind == "Indoor" else 1.0,
+                                  is_seasonal=kind == "Outdoor", x=x, y=y, region=(int(x // half), int(y // half))))
+    buyers = []
+    for j in range(n_buyers):
+        x, y = rng.uniform(0, size), rng.uniform(0, size)
+        buyers.append(Buyer(id=f"B{j}", demand_nominal=rng.uniform(100, 400), x=x, y=y,
+                            region=(int(x // half), int(y // half)) if buyer_regions else None))
+    return suppliers, buyers
+
+
+def run_unsharded(scenario, weather, **population):
+    suppliers, buyers = make_population(**population)
+    events = EventBus()
+    acc = RunAccumulator()
+    acc.attach(events)
+    fairness = FairnessModule(delta=scenario.delta, eps=1e-9, disp_cap=5.0)
+    policy = PolicyScoringModule(scenario)
+    marketplace = MarketplaceModule(EnvironmentalDataModule(0.0, {}, 0.0), fairness, policy,
+                                    SpatialIndex(suppliers, buyers, radius=RADIUS))
+    Simulation(suppliers, buyers, None, fairness, policy, marketplace, None, scenario,
+               events=events, weather=weather).run()
+    return suppliers, buyers, acc
+
+
+def run_sharded(scenario, weather, **population):
+    suppliers, buyers = make_population(**population)
+    events = EventBus()
+    acc = RunAccumulator()
+    acc.attach(events)
+    sim = ShardedSimulation(suppliers, buyers, scenario, radius=RADIUS, events=events, weather=weather)
+    assert sim.boundary, "the population should have boundary buyers"
+    return sim.run(), buyers, acc
+
+
+@pytest.mark.parametrize("key,smoothing,buyer_regions", [
+    ("S1", 0.0, True), ("S2", 0.0, True), ("S3", 0.0, True), ("S3", 0.3, True), ("S3", 0.3, False)])
+def test_sharded_equals_unsharded(key, smoothing, buyer_regions):
+    scenario = dataclasses.replace(SCENARIOS[key], T=30, reputation_smoothing=smoothing)
+    weather = weather_draws(scenario.T, 7)
+    ref_suppliers, ref_buyers, ref_acc = run_unsharded(scenario, weather, buyer_regions=buyer_regions)
+    suppliers, buyers, acc = run_sharded(scenario, weather, buyer_regions=buyer_regions)
+
+    fields = ("id", "Q", "F_unified", "waste_generated", "reputation")
+    assert [tuple(getattr(s, f) for f in fields) for s in suppliers] == \
+        [tuple(getattr(s, f) for f in fields) for s in ref_suppliers]
+    assert [b.waste_received for b in buyers] == [b.waste_received for b in ref_buyers]
+    assert extract_metrics(key, scenario, suppliers, acc, 7) == extract_metrics(key, scenario, ref_suppliers, ref_acc, 7)
+
+
+def test_buyers_routed_by_candidate_regions():
+    # Buyers without a region, or whose candidates all sit in another region, still go to one shard
+    suppliers, buyers = make_population(buyer_regions=False)
+    sim = ShardedSimulation(suppliers, buyers, SCENARIOS["S1"], radius=RADIUS)
+    index = SpatialIndex(suppliers, buyers, radius=RADIUS)
+    single = [idx for idx, b in enumerate(buyers) if len({s.region for s in index.candidates(b)}) <= 1]
+    assert single
+    assert sorted(idx for shard in sim.local.values() for idx, _ in shard) == single
+    assert all(len(regions) > 1 for _, _, _, regions in sim.boundary)
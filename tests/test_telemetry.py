@@ -0,0 +1,17 @@
+from telemetry import _status
+
+
+def rec(source, ts, rounds, final=False, **extra):
+    return {"ts": ts, "source": source, "elapsed_s": 10.0, "rounds": rounds, "rounds_per_sec": 50.0,
+            "runs_done": 2, "runs_per_sec": 0.2, "rss_mb": 40.0 + rounds / 100, "final": final, **extra}
+
+
+def test_live_then_final_totals():
+    latest = {"a": rec("a", 100.0, 500), "b": rec("b", 101.0, 300)}
+    line = _status(latest, latest["b"], stale=5.0)
+    assert "2 proc | 100 rounds/s | rss 88 MB" in line
+
+    latest = {"a": rec("a", 110.0, 1000, final=True), "b": rec("b", 112.0, 600, final=True)}
+    line = _status(latest, latest["b"], stale=5.0)
+    # 1600 rounds between the earliest start (100.0) and the last record (112.0)
+    assert "done: 2 proc | 1,600 rounds | 133 rounds/s avg | max rss 50 MB | runs 4" in line
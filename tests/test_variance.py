@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from variance import paired_difference, drought_controls, control_means
+from simulation import weather_draws
+
+
+def synthetic_runs(n, theta=2.0, beta=(0.5, -1.5), noise=0.01, seed=0):
+    rng = random.Random(seed)
+    means = control_means(100)
+    controls = [drought_controls(weather_draws(100, r)) for r in range(n)]
+    a, b = [], []
+    for c in controls:
+        base = rng.gauss(10.0, 3.0)  # shared by both scenarios, cancels in the pair
+        d = theta + sum(bi * (ci - mi) for bi, ci, mi in zip(beta, c, means)) + rng.gauss(0.0, noise)
+        a.append({"m": base + d})
+        b.append({"m": base})
+    return {"a": a, "b": b}, controls, means
+
+
+def test_control_means_match_draws():
+    draws = [drought_controls(weather_draws(100, r)) for r in range(4000)]
+    before, during = control_means(100)
+    assert abs(sum(c[0] for c in draws) / len(draws) - before) < 0.1
+    assert abs(sum(c[1] for c in draws) / len(draws) - during) < 0.05
+
+
+def test_control_variates_shrink_the_interval():
+    runs, controls, means = synthetic_runs(24)
+    plain = paired_difference(runs, "a", "b", "m")
+    controlled = paired_difference(runs, "a", "b", "m", controls=controls, means=means)
+    assert controlled["ci"][0] <= 2.0 <= controlled["ci"][1]
+    assert controlled["std_error"] < plain["std_error"] / 10
+    assert controlled["variance_reduction"] > plain["variance_reduction"]
+
+
+def test_too_few_replicas():
+    runs, controls, means = synthetic_runs(5)
+    with pytest.raises(ValueError):
+        paired_difference(runs, "a", "b", "m", controls=controls, means=means)
+    assert paired_difference(runs, "a", "b", "m")["replicas"] == 5
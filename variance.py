@@ -0,0 +1,174 @@
+import argparse
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from statistics import mean, variance
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from ensemble import MIN_REPLICAS, t_quantile
+from run_experiments import run_one
+from scenarios import SCENARIOS
+from simulation import weather_draws, DROUGHT_PROBABILITY, WINTER_START_FRACTION
+
+
+def _run_task(task):
+    key, replica, draws = task
+    return key, replica, run_one(key, seed=replica, weather=draws)
+
+
+def _winter_index(T: int) -> int:
+    # First winter round as an index into the draws (round t uses draws[t - 1])
+    return max(int(T * WINTER_START_FRACTION) - 1, 0)
+
+
+def drought_controls(draws: List[float]) -> Tuple[int, int]:
+    """
+    Drought rounds before and during winter (the rounds where seasonal farms
+    are already down to 10%). Their expectations are known exactly, and they
+    explain most of the weather noise left in a paired difference.
+    """
+    winter = _winter_index(len(draws))
+    before = sum(u < DROUGHT_PROBABILITY for u in draws[:winter])
+    during = sum(u < DROUGHT_PROBABILITY for u in draws[winter:])
+    return before, during
+
+
+def control_means(T: int) -> Tuple[float, float]:
+    winter = _winter_index(T)
+    return winter * DROUGHT_PROBABILITY, (T - winter) * DROUGHT_PROBABILITY
+
+
+def run_replicas(
+        scenario_keys: List[str],
+        n_replicas: int,
+        seed_start: int = 0,
+        workers: int = 1,
+) -> Tuple[Dict[str, List[Dict[str, float]]], List[Tuple[int, int]]]:
+    """
+    Common random numbers: every scenario in replica r sees the same weather
+    draws (seeded by seed_start + r). Returns ({key: [per-run summary dicts]},
+    [drought_controls per replica]), both ordered by replica.
+    """
+    T = max(SCENARIOS[k].T for k in scenario_keys)
+    tasks, controls = [], []
+    for r in range(seed_start, seed_start + n_replicas):
+        draws = weather_draws(T, r)
+        controls.append(drought_controls(draws))
+        tasks += [(key, r, draws) for key in scenario_keys]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_run_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        done = [_run_task(task) for task in tasks]
+
+    runs = {key: [] for key in scenario_keys}
+    for key, replica, metrics in sorted(done, key=lambda d: d[1]):
+        runs[key].append(metrics["summary"])
+    return runs, controls
+
+
+def paired_difference(
+        runs: Dict[str, List[Dict[str, float]]],
+        a: str,
+        b: str,
+        metric: str,
+        controls: Optional[List[Tuple[float, ...]]] = None,
+        means: Optional[Tuple[float, ...]] = None,
+        confidence: float = 0.95,
+) -> Dict[str, Any]:
+    """
+    Paired-difference estimator of E[metric(a) - metric(b)], from one
+    d_r = metric(a, r) - metric(b, r) per replica. With `controls` (per-replica
+    covariates of the weather with known expectations `means`) it is the
+    regression estimator: d is fitted on the centred controls and the
+    intercept is the estimate, with its OLS standard error and n - k - 1
+    degrees of freedom. `var_independent` is the per-run variance independent
+    weather per scenario would give, and `variance_reduction` compares the
+    estimator's variance with the one that would give for the same runs.
+    """
+    xa = [run[metric] for run in runs[a]]
+    xb = [run[metric] for run in runs[b]]
+    diffs = [x - y for x, y in zip(xa, xb)]
+    n = len(diffs)
+
+    var_paired = variance(diffs) if n > 1 else math.nan
+    # Controls constant over these replicas carry no information (and would make the fit singular)
+    X = np.ones((n, 1))
+    if controls is not None:
+        C = np.asarray(controls, dtype=float) - np.asarray(means, dtype=float)
+        X = np.column_stack([X, C[:, C.std(axis=0) > 0]])
+    k = X.shape[1] - 1
+    if n - k < MIN_REPLICAS:
+        raise ValueError(f"Need at least {MIN_REPLICAS + k} replicas for a usable confidence interval "
+                         f"with {k} controls, got {n}")
+
+    d = np.asarray(diffs)
+    coef, _, _, _ = np.linalg.lstsq(X, d, rcond=None)
+    resid = d - X @ coef
+    df = n - k - 1
+    s2 = float(resid @ resid) / df
+    se = math.sqrt(s2 * np.linalg.inv(X.T @ X)[0, 0])
+    hw = t_quantile(0.5 + confidence / 2.0, df) * se
+    diff = float(coef[0])
+    var_independent = variance(xa) + variance(xb)
+    var_estimator = se * se * n  # per-replica equivalent, comparable with var_independent
+    return {
+        "metric": metric,
+        "a": a,
+        "b": b,
+        "replicas": n,
+        "controls": k,
+        "diff_mean": diff,
+        "var_paired": var_paired,
+        "var_controlled": var_estimator,
+        "var_independent": var_independent,
+        "variance_reduction": var_independent / var_estimator if var_estimator > 0 else math.inf,
+        "std_error": se,
+        "ci": (diff - hw, diff + hw),
+    }
+
+
+def compare_scenarios(
+        pairs: List[Tuple[str, str]],
+        metrics: List[str],
+        n_replicas: int = 32,
+        seed_start: int = 0,
+        control_variates: bool = True,
+        workers: int = 1,
+        confidence: float = 0.95,
+) -> List[Dict[str, Any]]:
+    keys = sorted({k for pair in pairs for k in pair})
+    runs, controls = run_replicas(keys, n_replicas, seed_start=seed_start, workers=workers)
+    means = control_means(max(SCENARIOS[k].T for k in keys))
+    if not control_variates:
+        controls = means = None
+    return [
+        paired_difference(runs, a, b, m, controls=controls, means=means, confidence=confidence)
+        for a, b in pairs for m in metrics
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scenario differences with common random numbers")
+    parser.add_argument("--pairs", nargs="+", default=["S1:S3", "S2:S3"], metavar="A:B")
+    parser.add_argument("--metrics", nargs="+", default=["share_gini", "cost_mean", "total_waste"])
+    parser.add_argument("--replicas", type=int, default=32)
+    parser.add_argument("--seed-start", type=int, default=0)
+    parser.add_argument("--no-control-variates", action="store_true",
+                        help="Plain paired differences, without the drought-count control variates")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default="differences.json")
+    args = parser.parse_args()
+
+    pairs = [tuple(p.split(":")) for p in args.pairs]
+    report = compare_scenarios(pairs, args.metrics, n_replicas=args.replicas, seed_start=args.seed_start,
+                               control_variates=not args.no_control_variates, workers=args.workers)
+    for r in report:
+        print(f"{r['a']} - {r['b']} {r['metric']:<12} diff={r['diff_mean']:.4f} +/- {r['std_error']:.4f} (se)  "
+              f"variance reduction x{r['variance_reduction']:.1f}")
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {args.out}")
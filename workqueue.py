@@ -0,0 +1,399 @@
+import argparse
+import dataclasses
+import json
+import multiprocessing as mp
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+
+from run_experiments import run_scenario
+from results_store import ResultsStore
+from run_sensitivity import gamma_sweep_configs
+from scenarios import SCENARIOS
+from simulation import ScenarioConfig
+import telemetry
+
+
+# =========================
+#  TASKS
+# =========================
+#
+# A queue is a plain directory (local disk or a shared mount):
+#
+#   pending/<id>.json           waiting to be claimed
+#   claimed/<id>@<worker>.json  being run; mtime is the worker's heartbeat
+#   results/<id>.json           finished, not yet merged
+#   merged/<id>.json            merged into a ResultsStore (or gathered)
+#   failed/<id>.json            gave up after max_attempts
+#
+# Every state change is a single os.rename/os.replace within the queue
+# directory, which is atomic on POSIX filesystems (including NFS within one
+# export), so exactly one worker wins each claim.
+
+QUEUE_DIRS = ("pending", "claimed", "results", "merged", "failed", "tmp")
+
+
+def make_task(scenario: ScenarioConfig, scenario_key: str, seed: int, experiment: str = "default",
+              population: Optional[str] = None, headless: bool = False,
+              radius: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "scenario_key": scenario_key,
+        "config": dataclasses.asdict(scenario),
+        "seed": int(seed),
+        "experiment": experiment,
+        "population": population,
+        "headless": headless,
+        "radius": radius,
+        "attempts": 0,
+        "errors": [],
+    }
+
+
+def sweep_tasks(keys: List[str], seeds: List[int], experiment: str = "default",
+                population: Optional[str] = None, radius: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Scenario x seed grid, as run_experiments.run_to_store runs it."""
+    return [make_task(SCENARIOS[key], key, seed, experiment, population, radius=radius)
+            for seed in seeds for key in keys]
+
+
+def gamma_sweep_tasks(seed: int = 42) -> List[Dict[str, Any]]:
+    """The run_sensitivity gamma sweep, one task per point."""
+    return [make_task(cfg, "S3_gamma", seed, "gamma_sweep", headless=True) for cfg in gamma_sweep_configs()]
+
+
+def execute(task: Dict[str, Any]) -> Dict[str, Any]:
+    return run_scenario(ScenarioConfig(**task["config"]), task["scenario_key"], seed=task["seed"],
+                        headless=task["headless"], population=task["population"], radius=task.get("radius"))
+
+
+# =========================
+#  QUEUE
+# =========================
+
+class WorkQueue:
+    """
+    Filesystem work queue. `lease` is how long a claim may go without a
+    heartbeat before the coordinator assumes the worker died and requeues
+    the task; a task that crashes or times out `max_attempts` times is
+    moved to failed/.
+    """
+
+    def __init__(self, root: str, lease: float = 120.0, max_attempts: int = 3):
+        self.root = root
+        self.lease = lease
+        self.max_attempts = max_attempts
+        for d in QUEUE_DIRS:
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+
+    def _path(self, state: str, name: str) -> str:
+        return os.path.join(self.root, state, name)
+
+    def _list(self, state: str) -> List[str]:
+        return sorted(n for n in os.listdir(os.path.join(self.root, state)) if n.endswith(".json"))
+
+    def _write(self, state: str, name: str, obj: Dict[str, Any]) -> None:
+        # Write aside, then rename into place so readers never see partial files
+        tmp = self._path("tmp", f"{uuid.uuid4().hex}.part")
+        with open(tmp, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp, self._path(state, name))
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        with open(path) as f:
+            return json.load(f)
+
+    # ---- producer ----
+
+    def submit(self, tasks: List[Dict[str, Any]]) -> List[str]:
+        # Time-ordered ids so workers pick up tasks roughly in submission order
+        stamp = f"{time.time_ns():020d}"
+        ids = []
+        for i, task in enumerate(tasks):
+            task_id = f"{stamp}-{i:06d}-{uuid.uuid4().hex[:8]}"
+            task = dict(task, id=task_id)
+            self._write("pending", f"{task_id}.json", task)
+            ids.append(task_id)
+        return ids
+
+    # ---- worker ----
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        for name in self._list("pending"):
+            src = self._path("pending", name)
+            dst = self._path("claimed", f"{name[:-5]}@{worker_id}.json")
+            try:
+                os.utime(src)  # so the claim does not arrive with a stale submit-time mtime
+                os.rename(src, dst)
+            except FileNotFoundError:
+                continue  # another worker got it first
+            try:
+                # A peer may still requeue it (e.g. on a slow shared mount)
+                # before our own heartbeat; then it is simply not ours
+                os.utime(dst)
+                return dst, self._read(dst)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def complete(self, claim_path: str, task: Dict[str, Any], metrics: Dict[str, Any]) -> None:
+        self._write("results", f"{task['id']}.json", {"task": task, "metrics": metrics})
+        try:
+            os.remove(claim_path)
+        except FileNotFoundError:
+            pass  # requeued while we were running; the result is still valid
+
+    def fail(self, claim_path: str, task: Dict[str, Any], error: str) -> None:
+        try:
+            os.remove(claim_path)
+        except FileNotFoundError:
+            return  # already requeued by the coordinator
+        self._retry(task, error)
+
+    def _retry(self, task: Dict[str, Any], error: str) -> None:
+        task = dict(task, attempts=task["attempts"] + 1, errors=task["errors"] + [error])
+        state = "failed" if task["attempts"] >= self.max_attempts else "pending"
+        self._write(state, f"{task['id']}.json", task)
+
+    # ---- coordinator ----
+
+    def requeue_stale(self) -> int:
+        """Return claims whose heartbeat is older than the lease to pending/."""
+        now = time.time()
+        n = 0
+        for name in self._list("claimed"):
+            src = self._path("claimed", name)
+            try:
+                if now - os.path.getmtime(src) < self.lease:
+                    continue
+                # Rename first so only one coordinator handles it
+                stage = self._path("tmp", name)
+                os.rename(src, stage)
+            except FileNotFoundError:
+                continue
+            task = self._read(stage)
+            os.remove(stage)
+            task_id = task["id"]
+            if os.path.exists(self._path("results", f"{task_id}.json")) or \
+                    os.path.exists(self._path("merged", f"{task_id}.json")):
+                continue  # finished but died before releasing the claim
+            worker = name[len(task_id) + 1:-5]
+            self._retry(task, f"lease expired on {worker}")
+            n += 1
+        return n
+
+    def status(self) -> Dict[str, int]:
+        return {d: len(self._list(d)) for d in QUEUE_DIRS if d != "tmp"}
+
+    def idle(self) -> bool:
+        return not self._list("pending") and not self._list("claimed")
+
+    def _take_results(self, ids: Optional[set] = None) -> List[Dict[str, Any]]:
+        taken = []
+        for name in self._list("results"):
+            task_id = name[:-5]
+            if ids is not None and task_id not in ids:
+                continue
+            src = self._path("results", name)
+            if os.path.exists(self._path("merged", name)):
+                os.remove(src)  # duplicate from a worker whose lease had expired
+                continue
+            taken.append(self._read(src))
+            os.replace(src, self._path("merged", name))
+        return taken
+
+    def merge(self, store_path: str) -> int:
+        """Insert finished results into a ResultsStore, grouped by experiment."""
+        results = self._take_results()
+        tel = telemetry.current()
+        by_experiment: Dict[str, list] = {}
+        for r in results:
+            if tel is not None:
+                tel.run_done(r["metrics"])
+            task = r["task"]
+            by_experiment.setdefault(task["experiment"], []).append(
+                (ScenarioConfig(**task["config"]), task["seed"], r["metrics"]))
+        if results:
+            with ResultsStore(store_path) as store:
+                for experiment, records in by_experiment.items():
+                    store.insert_runs(records, experiment=experiment)
+        return len(results)
+
+    def wait(self, store_path: Optional[str] = None, poll: float = 2.0, progress=None) -> int:
+        """Requeue stale claims (and merge into `store_path`) until no work is left."""
+        merged = 0
+        tel = telemetry.current()
+        if tel is not None:
+            status = self.status()
+            tel.plan(status["pending"] + status["claimed"] + status["results"])
+        while True:
+            self.requeue_stale()
+            if store_path:
+                merged += self.merge(store_path)
+            if progress is not None:
+                progress(self.status())
+            if self.idle():
+                break
+            time.sleep(poll)
+        if store_path:
+            merged += self.merge(store_path)
+        return merged
+
+    def map(self, tasks: List[Dict[str, Any]], poll: float = 0.5) -> List[Dict[str, Any]]:
+        """Submit tasks and block until all results are in; metrics in task order."""
+        ids = self.submit(tasks)
+        pending = set(ids)
+        out = {}
+        while pending:
+            for r in self._take_results(pending):
+                out[r["task"]["id"]] = r["metrics"]
+                pending.discard(r["task"]["id"])
+            failed = [i for i in pending if os.path.exists(self._path("failed", f"{i}.json"))]
+            if failed:
+                raise RuntimeError(f"{len(failed)} task(s) failed, see {self._path('failed', failed[0] + '.json')}")
+            if pending:
+                self.requeue_stale()
+                time.sleep(poll)
+        return [out[i] for i in ids]
+
+
+# =========================
+#  WORKER
+# =========================
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, path: str, interval: float):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        return False
+
+
+def run_worker(root: str, worker_id: Optional[str] = None, lease: float = 120.0,
+               poll: float = 1.0, keep_alive: bool = False, max_attempts: int = 3) -> int:
+    """
+    Claim and run tasks until the queue is idle (or forever with keep_alive).
+    Safe to start any number of these, on any host that can see `root`.
+    """
+    queue = WorkQueue(root, lease=lease, max_attempts=max_attempts)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    done = 0
+    while True:
+        claim = queue.claim(worker_id)
+        if claim is None:
+            # Workers also recover dead peers' claims, so a coordinator is optional
+            queue.requeue_stale()
+            if not keep_alive and queue.idle():
+                tel = telemetry.current()
+                if tel is not None:
+                    tel.flush(final=True)  # worker processes skip atexit
+                return done
+            time.sleep(poll)
+            continue
+        path, task = claim
+        with _Heartbeat(path, lease / 4.0):
+            try:
+                metrics = execute(task)
+            except Exception:
+                queue.fail(path, task, traceback.format_exc(limit=5))
+                continue
+        queue.complete(path, task, metrics)
+        done += 1
+
+
+def spawn_workers(root: str, n: int, lease: float = 120.0, max_attempts: int = 3) -> List[mp.Process]:
+    """Start n local worker processes (for single-machine use and testing)."""
+    procs = [mp.Process(target=run_worker, args=(root, f"{socket.gethostname()}-local{i}", lease),
+                        kwargs={"max_attempts": max_attempts})
+             for i in range(n)]
+    for p in procs:
+        p.start()
+    return procs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filesystem work queue for sweeps across machines")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_submit = sub.add_parser("submit", help="Write sweep tasks into the queue")
+    p_submit.add_argument("queue")
+    p_submit.add_argument("--scenarios", nargs="+", default=["S1", "S2", "S3"])
+    p_submit.add_argument("--seeds", type=int, nargs="+", default=[42])
+    p_submit.add_argument("--experiment", default="default")
+    p_submit.add_argument("--population", metavar="PATH", default=None)
+    p_submit.add_argument("--radius", type=float, metavar="KM", default=None)
+    p_submit.add_argument("--gamma-sweep", action="store_true", help="Submit the run_sensitivity gamma sweep instead")
+
+    p_worker = sub.add_parser("worker", help="Claim and run tasks")
+    p_worker.add_argument("queue")
+    p_worker.add_argument("--id", default=None)
+    p_worker.add_argument("--lease", type=float, default=120.0)
+    p_worker.add_argument("--keep-alive", action="store_true", help="Keep polling when the queue is empty")
+    p_worker.add_argument("--max-attempts", type=int, default=3)
+    telemetry.add_telemetry_argument(p_worker)
+
+    p_coord = sub.add_parser("coordinate", help="Requeue crashed work and merge results until done")
+    p_coord.add_argument("queue")
+    p_coord.add_argument("--store", metavar="DB", default="results.db")
+    p_coord.add_argument("--lease", type=float, default=120.0)
+    p_coord.add_argument("--max-attempts", type=int, default=3)
+    p_coord.add_argument("--local-workers", type=int, default=0, help="Also start this many workers here")
+    telemetry.add_telemetry_argument(p_coord)
+
+    p_status = sub.add_parser("status")
+    p_status.add_argument("queue")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        queue = WorkQueue(args.queue)
+        if args.gamma_sweep:
+            tasks = gamma_sweep_tasks()
+        else:
+            tasks = sweep_tasks(args.scenarios, args.seeds, args.experiment, args.population, args.radius)
+        queue.submit(tasks)
+        print(f"Submitted {len(tasks)} tasks to {args.queue}")
+
+    elif args.command == "worker":
+        telemetry.configure(args.telemetry)
+        n = run_worker(args.queue, args.id, lease=args.lease, keep_alive=args.keep_alive,
+                       max_attempts=args.max_attempts)
+        print(f"Worker finished {n} tasks")
+
+    elif args.command == "coordinate":
+        queue = WorkQueue(args.queue, lease=args.lease, max_attempts=args.max_attempts)
+        telemetry.configure(args.telemetry)  # before spawning so local workers report too
+        procs = spawn_workers(args.queue, args.local_workers, lease=args.lease, max_attempts=args.max_attempts)
+        last = {}
+
+        def report(status):
+            if status != last:
+                print("  ".join(f"{k}={v}" for k, v in status.items()), flush=True)
+                last.update(status)
+
+        n = queue.wait(args.store, progress=report)
+        for p in procs:
+            p.join()
+        failed = queue.status()["failed"]
+        print(f"Merged {n} runs into {args.store}" + (f"; {failed} task(s) failed" if failed else ""))
+
+    else:
+        print(json.dumps(WorkQueue(args.queue).status()))